@@ -1,85 +1,96 @@
 #!/usr/bin/env python
-import mysql.connector
 import time
 import sys
-
-path_prefix='/cache/clas12'
-if len(sys.argv)>1:
-  path_prefix=sys.argv[1]
-
-now = time.strftime('%c')
-datetime = str(now)
-
-db = mysql.connector.connect(
-  host="scidbw.jlab.org",
-  user="dummy",
-  passwd="",
-  database="wdm"
-)
-
-cursor = db.cursor()
-
-cursor.execute('select reserved, cached/1024./1024./1024. from projectDisk where root = "%s"'%path_prefix)
-
-result_limits = cursor.fetchall()
-line_array = result_limits[0]
-reserved = float(line_array[0])
-used = float(line_array[1])
-
-cursor.execute('select sum(size)/1024/1024/1024 as size_GB from file, directory, projectDisk where file.dir_index = directory.dir_index and projectDisk.disk_index = directory.disk_index and isCached = 1 and isTaped = 1 and root = "%s" and file.owner = "halldata" and file_index not in (select file_index from pin);'%path_prefix)
-
-result = cursor.fetchall()
-farm_unpinned_line = result[0]
-farm_unpinned = float(farm_unpinned_line[0])
-
-target_size = used - reserved - farm_unpinned
-if target_size < 60000.0:
-  target_size = 60000.0
-
-dirlist = []
-def checkdir(dir):
-  if dir not in dirlist:
-    dirlist.append(dir)
-    return True
-  else:
-    return False
-
-title = path_prefix+':  Auto-Deletion Queue'
-
-print('<html>')
-print('<head><title>' + title + '</title></head>')
-print('<body>')
-print('<h1>' + title + '</h1>')
-print('<p>' + datetime + '</p>')
-
-print('<p>reserved = ' + str(reserved) + ', used = ' + str(used) + ', unpinned farm = ' + str(farm_unpinned) + ', volume of files listed here = ' + str(target_size) + ' (in GB)</p>')
-print('<table border>')
-print('<tr><th>running directory count</th><th>running sum of <br/> size of old files (GB)</th><th>directories with oldest files</th><th>running file count</th><th>oldest file in directory</th><th>file mod time</th><th>file owner</th></tr>')
-
-cursor.execute('select file.mod_time as mtime, file_name, file.owner, size, full_path from file, directory, projectDisk where file.dir_index = directory.dir_index and projectDisk.disk_index = directory.disk_index and isCached = 1 and isTaped = 1 and root = "%s" and file.owner != "halldata" and file_index not in (select file_index from pin) order by mtime;'%path_prefix)
-
-result = cursor.fetchall()
-
-count = 0
-count_dir = 0
-sum = float(0);
-for i in range(len(result)):
-  count += 1
-  line_array = result[i]
-  sum += float(line_array[3])
-  sum_gb = sum/1024.0/1024.0/1024.0
-  dir = str(line_array[4])
-  if checkdir(dir):
+import diskdb
+import diskreport
+import columnar
+
+def get_queue(path_prefix, target_size):
+  '''Return the auto-deletion queue table'''
+
+  table = diskreport.Table(['running directory count', 'running sum of <br/> size of old files (GB)',
+    'directories with oldest files', 'running file count', 'oldest file in directory',
+    'file mod time', 'file owner'])
+
+  # Let the database do the running sums, in order of file age, and find each
+  # directory's oldest file, returning only those rows up to and including the
+  # one where the running sum passes target_size:
+  query = 'select mtime, file_name, owner, full_path, file_count, sum_bytes from ('
+  query += ' select mtime, file_name, owner, size, full_path, file_count, sum_bytes,'
+  query += ' row_number() over (partition by full_path order by file_count) as dir_rank'
+  query += ' from ('
+  query += ' select file.mod_time as mtime, file_name, file.owner, size, full_path,'
+  query += ' row_number() over w as file_count, sum(size) over w as sum_bytes'
+  query += ' from file, directory, projectDisk'
+  query += ' where file.dir_index = directory.dir_index'
+  query += ' and projectDisk.disk_index = directory.disk_index'
+  query += ' and isCached = 1 and isTaped = 1 and root = %s'
+  query += ' and file.owner != %s'
+  query += ' and file_index not in (select file_index from pin)'
+  query += ' window w as (order by file.mod_time, file_index)'
+  query += ' ) as files ) as dirs'
+  query += ' where dir_rank = 1 and sum_bytes - size <= %s'
+  query += ' order by file_count'
+  params = (path_prefix, 'halldata', int(target_size*1024*1024*1024))
+
+  count_dir = 0
+  for mtime,file_name,owner,full_path,file_count,sum_bytes in diskdb.stream(query, params):
     count_dir += 1
-    line_str_array = []
-    for j in range(len(line_array)):
-      line_str_array.append(str(line_array[j]))
-    line = '<tr>' + '<td>' + str(count_dir) + '</td>' + '<td>%.1f'%sum_gb + '</td>' + '<td>' + line_str_array[4].replace(path_prefix+'/','') + '</td>' + '<td>' + str(count) + '</td>' + '<td>' + line_str_array[1] + '</td>' + '<td>' + line_str_array[0] + '</td>' + '<td>' + line_str_array[2] + '</td>' + '</tr>'
-    print(line)
-  if sum_gb > target_size:
-    break
-
-print('</table>')
-print('</body>')
-print('</html>')
-
+    sum_gb = float(sum_bytes)/1024.0/1024.0/1024.0
+    table.add(count_dir, '%.1f'%sum_gb, str(full_path).replace(path_prefix+'/',''), file_count, file_name, mtime, owner)
+
+  return table
+
+def report(path_prefix, sections=None, export=None):
+
+  if sections is None:
+    sections = diskreport.SectionCache()
+
+  now = time.strftime('%c')
+  datetime = str(now)
+
+  reserved, used = diskdb.get_project_disk(path_prefix)
+
+  # a cheap fingerprint of the inputs, to reuse the queue if nothing changed:
+  query = 'select count(*), min(file.mod_time), max(file.mod_time), sum(size), (select count(*) from pin)'
+  query += ' from file, directory, projectDisk'
+  query += ' where file.dir_index = directory.dir_index'
+  query += ' and projectDisk.disk_index = directory.disk_index'
+  query += ' and isCached = 1 and isTaped = 1 and root = %s'
+  fingerprint = list(diskdb.fetchall(query, (path_prefix,))[0])
+
+  query = 'select sum(size)/1024/1024/1024 as size_GB from file, directory, projectDisk where file.dir_index = directory.dir_index and projectDisk.disk_index = directory.disk_index and isCached = 1 and isTaped = 1 and root = %s and file.owner = %s and file_index not in (select file_index from pin)'
+  result = diskdb.fetchall(query, (path_prefix, 'halldata'))
+  farm_unpinned_line = result[0]
+  farm_unpinned = float(farm_unpinned_line[0])
+
+  target_size = used - reserved - farm_unpinned
+  if target_size < 60000.0:
+    target_size = 60000.0
+
+  page = diskreport.Page(path_prefix+':  Auto-Deletion Queue')
+  page.add('<p>' + datetime + '</p>')
+  page.add('<p>reserved = ' + str(reserved) + ', used = ' + str(used) + ', unpinned farm = ' + str(farm_unpinned) + ', volume of files listed here = ' + str(target_size) + ' (in GB)</p>')
+  page.add(sections.get(path_prefix+':queue', fingerprint+[target_size],
+    lambda: get_queue(path_prefix, target_size)))
+
+  # today's columnar snapshot, for offline analytics:
+  if export is not None:
+    query = 'select full_path, file_name, file.owner, size, file.mod_time'
+    query += ' from file, directory, projectDisk'
+    query += ' where file.dir_index = directory.dir_index'
+    query += ' and projectDisk.disk_index = directory.disk_index'
+    query += ' and isCached = 1 and isTaped = 1 and root = %s'
+    # (the report's still good without it)
+    try:
+      columnar.export(export, path_prefix, diskdb.stream(query, (path_prefix,)))
+    except Exception as e:
+      print('ERROR:  columnar export of %s failed:  %s'%(path_prefix,e), file=sys.stderr)
+
+  return page
+
+if __name__ == '__main__':
+  path_prefix='/cache/clas12'
+  if len(sys.argv)>1:
+    path_prefix=sys.argv[1]
+  print(report(path_prefix))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+#
+# Compact columnar snapshots of the disk usage, one file per report and
+# day, for answering historical questions locally instead of re-querying
+# the database, e.g. which owners grew fastest this month:
+#
+#   columnar.py -dir DIR -name volatile-clas12 -by owner -from 2024-01-01
+#
+# Each file is a JSON header line followed by one zlib-compressed block per
+# column:  integer columns are int64 arrays, and string columns are
+# dictionary-encoded as an int32 array of codes into a list of values.
+# Group-bys are vectorized with numpy if it's available.
+#
+
+import os
+import sys
+import json
+import time
+import zlib
+import array
+import datetime
+import argparse
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+suffix = '.col'
+
+class Dictionary():
+  '''Dictionary-encoding of a string column'''
+  def __init__(self):
+    self.codes = array.array('i')
+    self.values = []
+    self.index = {}
+  def append(self, x):
+    x = str(x)
+    if x not in self.index:
+      self.index[x] = len(self.values)
+      self.values.append(x)
+    self.codes.append(self.index[x])
+
+def to_seconds(x):
+  '''Return a database time, a datetime, number or string of either, as
+  integer unix seconds'''
+  if isinstance(x, str):
+    try:
+      x = float(x)
+    except ValueError:
+      x = datetime.datetime.strptime(x[:19], '%Y-%m-%d %H:%M:%S')
+  if isinstance(x, datetime.datetime):
+    return int(time.mktime(x.timetuple()))
+  return int(x)
+
+def partition(directory, day=None):
+  if day is None:
+    day = time.strftime('%Y-%m-%d')
+  return os.path.join(directory, day)
+
+def label(root):
+  '''Return the file name label of a disk root, e.g. volatile-clas12'''
+  return root.strip('/').replace('/','-')
+
+def write(path, root, rows):
+  '''Write rows of (dir, file_name, owner, size, mtime) below root to a
+  columnar file'''
+  dirs, names, owners = Dictionary(), [], Dictionary()
+  sizes, mtimes = array.array('q'), array.array('q')
+  for full_path,file_name,owner,size,mtime in rows:
+    dirs.append(full_path)
+    names.append(str(file_name))
+    owners.append(owner)
+    sizes.append(int(size))
+    mtimes.append(to_seconds(mtime))
+  blocks = [
+    ('dir', 'dict', dirs.codes.tobytes(), '\0'.join(dirs.values).encode('utf-8','surrogateescape')),
+    ('name', 'str', None, '\0'.join(names).encode('utf-8','surrogateescape')),
+    ('owner', 'dict', owners.codes.tobytes(), '\0'.join(owners.values).encode('utf-8','surrogateescape')),
+    ('size', 'q', sizes.tobytes(), None),
+    ('mtime', 'q', mtimes.tobytes(), None),
+  ]
+  header = {'root':root, 'rows':len(sizes), 'time':int(time.time()), 'columns':[]}
+  data = []
+  for name,kind,numbers,strings in blocks:
+    column = {'name':name, 'kind':kind}
+    if numbers is not None:
+      data.append(zlib.compress(numbers))
+      column['numbers'] = len(data[-1])
+    if strings is not None:
+      data.append(zlib.compress(strings))
+      column['strings'] = len(data[-1])
+    header['columns'].append(column)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path+'.tmp','wb') as f:
+    f.write(json.dumps(header).encode()+b'\n')
+    for x in data:
+      f.write(x)
+  os.replace(path+'.tmp', path)
+  return header['rows']
+
+def read(path, columns=None):
+  '''Return the header and a dictionary of the requested columns:  integer
+  columns are arrays, string columns are lists, and dictionary-encoded
+  columns are (codes,values), with numpy arrays instead if available'''
+  ret = {}
+  with open(path,'rb') as f:
+    header = json.loads(f.readline())
+    for column in header['columns']:
+      numbers, strings = None, None
+      if 'numbers' in column:
+        numbers = f.read(column['numbers'])
+      if 'strings' in column:
+        strings = f.read(column['strings'])
+      if columns is not None and column['name'] not in columns:
+        continue
+      if strings is not None:
+        strings = zlib.decompress(strings).decode('utf-8','surrogateescape')
+        strings = strings.split('\0') if len(strings) > 0 else []
+      if numbers is not None:
+        x = array.array('i' if column['kind'] == 'dict' else 'q')
+        x.frombytes(zlib.decompress(numbers))
+        if numpy is not None:
+          x = numpy.frombuffer(x, dtype=numpy.int32 if column['kind'] == 'dict' else numpy.int64)
+        numbers = x
+      if column['kind'] == 'dict':
+        ret[column['name']] = (numbers, strings)
+      elif column['kind'] == 'str':
+        ret[column['name']] = strings
+      else:
+        ret[column['name']] = numbers
+  return header, ret
+
+def export(directory, root, rows):
+  '''Write today's snapshot of a disk root, if it's not already there, and
+  return the number of rows written'''
+  path = os.path.join(partition(directory), label(root)+suffix)
+  if os.path.exists(path):
+    return 0
+  return write(path, root, rows)
+
+def group_sums(codes, ngroups, weights=None):
+  '''Return the count or weighted sum of each group code'''
+  if numpy is not None:
+    return numpy.bincount(codes, weights=weights, minlength=ngroups).tolist()
+  ret = [0]*ngroups
+  if weights is None:
+    for c in codes:
+      ret[c] += 1
+  else:
+    for c,w in zip(codes,weights):
+      ret[c] += w
+  return ret
+
+def regroup(codes, mapping):
+  '''Return codes mapped to other codes, e.g. directories to their tops'''
+  if numpy is not None:
+    return numpy.asarray(mapping, dtype=numpy.int32)[codes]
+  return array.array('i', [ mapping[c] for c in codes ])
+
+def aggregate(path, by):
+  '''Return {group:[files,bytes]} of a snapshot, grouped by owner, dir
+  or top, the first directory below root'''
+  header, cols = read(path, ['dir' if by in ['dir','top'] else by, 'size'])
+  root = header['root']
+  codes, values = cols['owner' if by == 'owner' else 'dir']
+  if by == 'top':
+    tops = {}
+    mapping = []
+    for x in values:
+      x = x[len(root):].strip('/').split('/')[0] if x.startswith(root+'/') else x
+      mapping.append(tops.setdefault(x, len(tops)))
+    codes = regroup(codes, mapping)
+    values = sorted(tops, key=tops.get)
+  sizes = cols['size']
+  if numpy is not None:
+    sizes = sizes.astype(numpy.float64)
+  counts = group_sums(codes, len(values))
+  sums = group_sums(codes, len(values), sizes)
+  return dict([ (v,[int(counts[i]),float(sums[i])]) for i,v in enumerate(values) ])
+
+cli = argparse.ArgumentParser(description='Query columnar disk-usage snapshots.')
+cli.add_argument('-dir', required=True, help='snapshot directory, with one subdirectory per date')
+cli.add_argument('-name', required=True, help='snapshot name, e.g. volatile-clas12')
+cli.add_argument('-by', default='owner', choices=['owner','dir','top'], help='group by (default=owner)')
+cli.add_argument('-from', dest='start', default=None, metavar='DATE', help='first date, YYYY-MM-DD (default=oldest)')
+cli.add_argument('-to', dest='end', default=None, metavar='DATE', help='last date, YYYY-MM-DD (default=newest)')
+cli.add_argument('-limit', default=20, type=int, help='number of groups to print (default=20)')
+cli.add_argument('-json', default=False, action='store_true', help='print JSON instead')
+
+def main(argv):
+  args = cli.parse_args(argv)
+  days = []
+  if os.path.isdir(args.dir):
+    days = sorted([ x for x in os.listdir(args.dir) if os.path.exists(os.path.join(args.dir,x,args.name+suffix)) ])
+  days = [ x for x in days if (args.start is None or x >= args.start) and (args.end is None or x <= args.end) ]
+  if len(days) == 0:
+    cli.error('No snapshots of %s in %s'%(args.name,args.dir))
+  first = aggregate(os.path.join(args.dir,days[0],args.name+suffix), args.by)
+  last = first
+  if len(days) > 1:
+    last = aggregate(os.path.join(args.dir,days[-1],args.name+suffix), args.by)
+  # growth between the first and last days, biggest first:
+  ret = []
+  for x in set(first) | set(last):
+    a, b = first.get(x,[0,0]), last.get(x,[0,0])
+    ret.append({args.by:x, 'files':b[0], 'gb':b[1]/1024./1024./1024., 'delta_files':b[0]-a[0], 'delta_gb':(b[1]-a[1])/1024./1024./1024.})
+  ret.sort(key=lambda x: (-x['delta_gb'], -x['gb']))
+  ret = ret[:args.limit]
+  if args.json:
+    print(json.dumps({'from':days[0], 'to':days[-1], 'groups':ret}, indent=2))
+    return
+  print('%s to %s, by %s:'%(days[0],days[-1],args.by))
+  print('%12s %12s %12s %10s  %s'%('GB','delta GB','files','delta','group'))
+  for x in ret:
+    print('%12.1f %+12.1f %12d %+10d  %s'%(x['gb'],x['delta_gb'],x['files'],x['delta_files'],x[args.by]))
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
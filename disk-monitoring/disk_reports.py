@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+#
+# Run a family of the disk HTML reports in one process, so they share one
+# database connection and the cached results of the global queries.
+#
+
+import sys
+import argparse
+import diskreport
+import volatile_html
+import cache_html
+
+cli = argparse.ArgumentParser(description='Generate disk HTML reports, sharing one database connection.')
+cli.add_argument('-volatile', default=[], nargs=2, metavar=('PATH','HTML'), action='append', help='write a /volatile report for PATH to the file HTML, repeatable')
+cli.add_argument('-cache', default=[], nargs=2, metavar=('PATH','HTML'), action='append', help='write a /cache report for PATH to the file HTML, repeatable')
+cli.add_argument('-export', default=None, metavar='DIR', help='also write daily columnar snapshots, for columnar.py queries')
+cli.add_argument('-sections', default=None, metavar='JSON', help='cache of rendered sections, only re-rendered when their inputs change')
+
+def main(argv):
+  args = cli.parse_args(argv)
+  if len(args.volatile) + len(args.cache) == 0:
+    cli.error('At least one of -volatile/-cache is required.')
+  sections = diskreport.SectionCache(args.sections)
+  status = 0
+  for module,reports in [(volatile_html,args.volatile), (cache_html,args.cache)]:
+    for path,html in reports:
+      # one failed report shouldn't stop the others:
+      try:
+        page = module.report(path, sections, args.export)
+      except Exception as e:
+        print('ERROR:  %s report for %s failed:  %s'%(module.__name__,path,e), file=sys.stderr)
+        status = 1
+        continue
+      with open(html,'w') as f:
+        f.write(str(page)+'\n')
+  sections.save()
+  sys.exit(status)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+#
+# Snapshot a directory tree into the same ${label}_dir/_file/_updateTime
+# tables as disk-database.pl, for disk-report.pl, but incrementally:
+#
+# The tree is crawled by parallel scandir workers, and each directory's
+# file count, bytes and a digest of its files' names, sizes, access times
+# and owners are compared with the previous snapshot, kept in the
+# ${label}_snapshot table.  Only new, deleted and changed directories'
+# rows are rewritten, in batched multi-row inserts and in one transaction,
+# and the new, deleted, grown and shrunk directories are recorded in the
+# ${label}_diff table, for growth rates.
+#
+
+import os
+import sys
+import time
+import fnmatch
+import hashlib
+import argparse
+import concurrent.futures
+
+cli = argparse.ArgumentParser(description='Snapshot a directory tree into the disk database, incrementally.')
+cli.add_argument('top', help='top level directory')
+cli.add_argument('label', help='report label, the prefix of the table names')
+cli.add_argument('-threads', default=16, type=int, help='number of parallel scandir workers (default=16)')
+cli.add_argument('-prune', default=['*/.snapshot','*/.zfs'], action='append', help='fnmatch pattern of directory paths not to crawl, repeatable (default=*/.snapshot,*/.zfs)')
+cli.add_argument('-batch', default=5000, type=int, help='rows per multi-row insert (default=5000)')
+cli.add_argument('-password', default='/home/baltzell/.mysql/diskmanager.pwd', help='file with the diskmanager MySQL password, the same as disk-database.pl (default=%(default)s)')
+cli.add_argument('-sqlite', default=None, metavar='PATH', help='use an SQLite file instead of MySQL, for testing')
+cli.add_argument('-dryrun', default=False, action='store_true', help='only crawl and print the differences')
+
+def read_files(path):
+  '''Return the sorted (name,atime,size,uid) of a directory's regular files,
+  and its subdirectories' entries'''
+  files = []
+  subdirs = []
+  try:
+    entries = list(os.scandir(path))
+  except OSError as e:
+    print('cannot read %s:  %s'%(path,e))
+    entries = []
+  for x in entries:
+    try:
+      if x.is_dir(follow_symlinks=False):
+        subdirs.append(x)
+      elif x.is_file(follow_symlinks=False):
+        s = x.stat(follow_symlinks=False)
+        files.append((x.name, time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(s.st_atime)), s.st_size, s.st_uid))
+    except OSError:
+      print('cannot stat %s'%x.path)
+  files.sort()
+  return files, subdirs
+
+def digest(files):
+  return hashlib.md5(repr(files).encode('utf-8','surrogateescape')).hexdigest()
+
+def scan_dir(path, dev, prune):
+  '''Return the directory's record and its subdirectories to crawl.  Only
+  the files' count, bytes and digest are kept, and their rows are read
+  again later if the directory changed.'''
+  st = os.stat(path, follow_symlinks=False)
+  files, entries = read_files(path)
+  subdirs = []
+  for x in entries:
+    try:
+      if x.stat(follow_symlinks=False).st_dev != dev:
+        continue
+    except OSError:
+      print('cannot stat %s'%x.path)
+      continue
+    if not any([fnmatch.fnmatchcase(x.path,p) for p in prune]):
+      subdirs.append(x.path)
+  record = {'uid':st.st_uid, 'size':st.st_size, 'nfiles':len(files),
+    'bytes':sum([f[2] for f in files]), 'digest':digest(files)}
+  return record, subdirs
+
+def crawl(top, threads, prune):
+  '''Return a record for every directory below top, on the same device,
+  with up to threads directories being read at once'''
+  dev = os.stat(top).st_dev
+  records = {}
+  with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+    pending = {pool.submit(scan_dir, top, dev, prune):top}
+    while len(pending) > 0:
+      done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+      for future in done:
+        path = pending.pop(future)
+        try:
+          record, subdirs = future.result()
+        except OSError as e:
+          print('cannot stat %s:  %s'%(path,e))
+          continue
+        records[path] = record
+        for x in subdirs:
+          pending[pool.submit(scan_dir, x, dev, prune)] = x
+        if len(records)%1000 == 0:
+          print('%d: dirname = %s'%(len(records),path))
+  return records
+
+class Snapshot():
+  '''The tables of one label, and their previous snapshot'''
+
+  def __init__(self, db, label, sqlite):
+    self.db = db
+    self.sqlite = sqlite
+    self.dir_table = label + '_dir'
+    self.file_table = label + '_file'
+    self.update_time_table = label + '_updateTime'
+    self.snapshot_table = label + '_snapshot'
+    self.diff_table = label + '_diff'
+    self.cursor = db.cursor()
+    autoincrement = 'autoincrement' if sqlite else 'auto_increment'
+    self.execute('create table if not exists %s (id integer primary key %s, dirname varchar(256), size int, uid smallint)'%(self.dir_table,autoincrement))
+    self.execute('create table if not exists %s (id integer primary key %s, filename varchar(256), dirId int, atime datetime, size bigint, uid smallint)'%(self.file_table,autoincrement))
+    self.index(self.file_table, 'dirId')
+    self.execute('create table if not exists %s (updateTime timestamp)'%self.update_time_table)
+    self.execute('create table if not exists %s (dirId int primary key, files int, bytes bigint, digest char(32))'%self.snapshot_table)
+    self.execute('create table if not exists %s (updateTime datetime, dirname varchar(256), state varchar(8), files int, bytes bigint, delta_bytes bigint)'%self.diff_table)
+
+  def index(self, table, column):
+    '''Index a column, if it isn't already, e.g. in tables from the perl loader'''
+    if self.sqlite:
+      self.execute('create index if not exists %s_%s on %s (%s)'%(table,column,table,column))
+    else:
+      self.execute('show index from %s where Column_name = %%s'%table, (column,))
+      if len(self.cursor.fetchall()) == 0:
+        self.execute('create index %s on %s (%s)'%(column,table,column))
+
+  def execute(self, query, params=()):
+    if self.sqlite:
+      query = query.replace('%s','?')
+    self.cursor.execute(query, params)
+
+  def executemany(self, query, rows, batch):
+    '''Execute an insert in batches, which the MySQL connector turns into
+    multi-row inserts'''
+    if self.sqlite:
+      query = query.replace('%s','?')
+    for i in range(0, len(rows), batch):
+      self.cursor.executemany(query, rows[i:i+batch])
+
+  def delete(self, table, column, ids, batch):
+    '''Delete the rows with any of the ids, in batches'''
+    for i in range(0, len(ids), batch):
+      x = ids[i:i+batch]
+      self.execute('delete from %s where %s in (%s)'%(table,column,','.join(['%s']*len(x))), x)
+
+  def previous(self):
+    '''Return the previous snapshot's directories, and whether there was one'''
+    self.execute('select count(*) from %s'%self.snapshot_table)
+    exists = self.cursor.fetchone()[0] > 0
+    self.execute('select id, dirname, size, uid, files, bytes, digest from %s left join %s on dirId = id'%(self.dir_table,self.snapshot_table))
+    ret = {}
+    for id,dirname,size,uid,files,nbytes,digest in self.cursor.fetchall():
+      ret[dirname] = {'id':id, 'size':size, 'uid':uid, 'nfiles':files, 'bytes':nbytes, 'digest':digest}
+    return ret, exists
+
+  def update(self, records, batch, threads):
+    '''Rewrite only what changed since the previous snapshot, and return
+    the differences'''
+    old, exists = self.previous()
+    now = time.strftime('%Y-%m-%d %H:%M:%S')
+    diffs = []
+    deleted = set([ x for x in old if x not in records ])
+    changed = set([ x for x in records if x in old and records[x]['digest'] != old[x]['digest'] ])
+    new = set([ x for x in records if x not in old ])
+    if exists:
+      for x in deleted:
+        diffs.append((now, x, 'deleted', old[x]['nfiles'], old[x]['bytes'], -(old[x]['bytes'] or 0)))
+      for x in new:
+        diffs.append((now, x, 'new', records[x]['nfiles'], records[x]['bytes'], records[x]['bytes']))
+      for x in changed:
+        delta = records[x]['bytes'] - (old[x]['bytes'] or 0)
+        if delta != 0:
+          diffs.append((now, x, 'grown' if delta > 0 else 'shrunk', records[x]['nfiles'], records[x]['bytes'], delta))
+    # new directories get ids here, so their files can be inserted in bulk:
+    self.execute('select max(id) from %s'%self.dir_table)
+    next_id = (self.cursor.fetchone()[0] or 0) + 1
+    for x in new:
+      records[x]['id'] = next_id
+      next_id += 1
+    for x in records:
+      if x in old:
+        records[x]['id'] = old[x]['id']
+    # directories whose files get rewritten:
+    stale = [ old[x]['id'] for x in deleted|changed ]
+    self.delete(self.file_table, 'dirId', stale, batch)
+    self.delete(self.snapshot_table, 'dirId', stale, batch)
+    self.delete(self.dir_table, 'id', [ old[x]['id'] for x in deleted ], batch)
+    self.executemany('update %s set size = %%s, uid = %%s where id = %%s'%self.dir_table,
+      [ (records[x]['size'], records[x]['uid'], old[x]['id']) for x in records if x in old and
+        (records[x]['size'],records[x]['uid']) != (old[x]['size'],old[x]['uid']) ], batch)
+    self.executemany('insert into %s (id, dirname, size, uid) values (%%s,%%s,%%s,%%s)'%self.dir_table,
+      [ (records[x]['id'], x, records[x]['size'], records[x]['uid']) for x in new ], batch)
+    # read the files of new and changed directories again, a batch of
+    # directories at a time, rather than keeping every file from the crawl:
+    nrows = 0
+    dirs = sorted(new|changed)
+    with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+      for i in range(0, len(dirs), batch):
+        rows = []
+        for x,(files,_) in zip(dirs[i:i+batch], pool.map(read_files, dirs[i:i+batch])):
+          rows.extend([ (f[0], records[x]['id'], f[1], f[2], f[3]) for f in files ])
+          records[x].update(nfiles=len(files), bytes=sum([f[2] for f in files]), digest=digest(files))
+        self.executemany('insert into %s (filename, dirId, atime, size, uid) values (%%s,%%s,%%s,%%s,%%s)'%self.file_table, rows, batch)
+        nrows += len(rows)
+    # directories from the perl loader don't have a snapshot yet:
+    self.executemany('insert into %s (dirId, files, bytes, digest) values (%%s,%%s,%%s,%%s)'%self.snapshot_table,
+      [ (records[x]['id'], records[x]['nfiles'], records[x]['bytes'], records[x]['digest']) for x in records
+        if x in new or x in changed or old[x]['digest'] is None ], batch)
+    self.executemany('insert into %s (updateTime, dirname, state, files, bytes, delta_bytes) values (%%s,%%s,%%s,%%s,%%s,%%s)'%self.diff_table, diffs, batch)
+    self.execute('delete from %s'%self.update_time_table)
+    self.execute('insert into %s (updateTime) values (%%s)'%self.update_time_table, (now,))
+    self.db.commit()
+    print('directories: %d new, %d deleted, %d changed, %d unchanged; %d file rows written'%(
+      len(new), len(deleted), len(changed), len(records)-len(new)-len(changed), nrows))
+    return diffs
+
+def connect(args):
+  if args.sqlite is not None:
+    import sqlite3
+    return sqlite3.connect(args.sqlite)
+  import mysql.connector
+  with open(args.password) as f:
+    password = f.readline().strip()
+  return mysql.connector.connect(host='clasdb.jlab.org', user='diskmanager',
+    passwd=password, database='diskManagement')
+
+def main(argv):
+  args = cli.parse_args(argv)
+  top = os.path.normpath(args.top)
+  if not os.path.isdir(top):
+    cli.error('Not a directory:  '+args.top)
+  print('Start Time:  '+time.strftime('%c'))
+  records = crawl(top, args.threads, args.prune)
+  print('crawled %d directories and %d files'%(len(records),sum([x['nfiles'] for x in records.values()])))
+  if args.dryrun:
+    return
+  db = connect(args)
+  diffs = Snapshot(db, args.label, args.sqlite is not None).update(records, args.batch, args.threads)
+  db.close()
+  for x in sorted(diffs, key=lambda x: -abs(x[5] or 0))[:20]:
+    print('%8s %12.3f GB  %s'%(x[2],float(x[5] or 0)/1e9,x[1]))
+  print('End Time:  '+time.strftime('%c'))
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,113 @@
+#
+# Common access to scicomp's disk management database (wdm) for the
+# disk-monitoring reports.
+#
+# All queries in a process share one connection, opened on first use and
+# reopened if it was closed, take parameters rather than interpolating
+# them into the SQL, and cache the results of the small global queries.
+#
+# For testing, set DISKDB_SQLITE to the path of an SQLite file with the
+# same tables, and it's used instead.  Queries are written with MySQL's
+# %s placeholders, which get converted for SQLite.
+#
+
+import os
+
+try:
+  import mysql.connector
+  Error = mysql.connector.Error
+except ImportError:
+  mysql = None
+  Error = Exception
+
+sqlite_path = os.environ.get('DISKDB_SQLITE')
+
+if sqlite_path is not None:
+  import sqlite3
+  Error = sqlite3.Error
+
+connection = None
+cache = {}
+
+def connect():
+  '''Return the shared connection, connecting if necessary'''
+  global connection
+  if connection is not None and sqlite_path is None:
+    if not connection.is_connected():
+      connection = None
+  if connection is None:
+    if sqlite_path is not None:
+      connection = sqlite3.connect(sqlite_path)
+    else:
+      connection = mysql.connector.connect(
+        host="scidbw.jlab.org",
+        user="dummy",
+        passwd="",
+        database="wdm"
+      )
+  return connection
+
+def close():
+  '''Close the shared connection, e.g. to abandon an unread result'''
+  global connection
+  if connection is not None:
+    try:
+      connection.close()
+    except Error:
+      pass
+    connection = None
+
+def execute(query, params=()):
+  '''Execute a query with parameters, and return its cursor'''
+  if sqlite_path is not None:
+    query = query.replace('%s','?')
+  cursor = connect().cursor()
+  cursor.execute(query, tuple(params))
+  return cursor
+
+def fetchall(query, params=()):
+  '''Return all the rows from a query'''
+  cursor = execute(query, params)
+  ret = cursor.fetchall()
+  cursor.close()
+  return ret
+
+def fetchall_cached(query, params=()):
+  '''Return all the rows from a query, only querying the first time'''
+  key = (query, tuple(params))
+  if key not in cache:
+    cache[key] = fetchall(query, params)
+  return cache[key]
+
+def get_project_disk(root):
+  '''Return reserved and used (cached) GB of a project disk, from one query
+  of all of them shared by all reports'''
+  query = 'select root, reserved, cached/1024./1024./1024. from projectDisk'
+  for x,reserved,used in fetchall_cached(query):
+    if x == root:
+      return float(reserved), float(used)
+  raise ValueError('Unknown projectDisk root:  '+root)
+
+def stream(query, params=(), batch=10000):
+  '''Yield the rows from a query, fetched from the server in batches rather
+  than all at once.  If the caller stops early and closes the generator,
+  the connection is closed, and the next query will reconnect.  That still
+  reads the rest of the result off the wire (the connector's C extension
+  drains it when freeing it), so stopping early only saves converting the
+  rows:  queries should limit their rows in SQL wherever they know how
+  many they need.'''
+  cursor = execute(query, params)
+  finished = False
+  try:
+    while True:
+      rows = cursor.fetchmany(batch)
+      if len(rows) == 0:
+        finished = True
+        break
+      for row in rows:
+        yield row
+  finally:
+    if finished:
+      cursor.close()
+    else:
+      close()
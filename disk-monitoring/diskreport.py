@@ -0,0 +1,94 @@
+#
+# Building blocks for the disk-monitoring HTML reports.
+#
+
+import os
+import json
+import time
+
+class Table():
+  '''An HTML table, built row by row from already formatted cells'''
+  def __init__(self, headers):
+    self.headers = headers
+    self.rows = []
+  def add(self, *cells):
+    self.rows.append(cells)
+  def __str__(self):
+    lines = ['<table border>']
+    lines.append('<tr>' + ''.join(['<th>%s</th>'%x for x in self.headers]) + '</tr>')
+    for row in self.rows:
+      lines.append('<tr>' + ''.join(['<td>%s</td>'%x for x in row]) + '</tr>')
+    lines.append('</table>')
+    return '\n'.join(lines)
+
+class Page():
+  '''An HTML page, with a title and a body of HTML strings and tables'''
+  def __init__(self, title):
+    self.title = title
+    self.body = []
+  def add(self, x):
+    self.body.append(x)
+  def __str__(self):
+    lines = ['<html>']
+    lines.append('<head><title>%s</title></head>'%self.title)
+    lines.append('<body>')
+    lines.append('<h1>%s</h1>'%self.title)
+    lines.extend([str(x) for x in self.body])
+    lines.append('</body>')
+    lines.append('</html>')
+    return '\n'.join(lines)
+
+class DeletionQueue():
+  '''The oldest file in each directory, from files fed in order of age,
+  with running file counts and size sums, until the sum passes a target
+  or there are enough directories'''
+  def __init__(self, target_gb, max_rows=None):
+    self.target_gb = target_gb
+    self.max_rows = max_rows
+    self.seen = set()
+    self.rows = []
+    self.count = 0
+    self.sum_gb = 0
+  def add(self, mtime, file_name, owner, size, full_path):
+    '''Add the next oldest file, and return whether more are wanted'''
+    self.count += 1
+    self.sum_gb += float(size)/1024.0/1024.0/1024.0
+    if full_path in self.seen:
+      return True
+    if self.sum_gb > self.target_gb:
+      return False
+    if self.max_rows is not None and len(self.rows) > self.max_rows:
+      return False
+    self.seen.add(full_path)
+    self.rows.append({'count_dir':len(self.rows)+1, 'count':self.count, 'sum_gb':self.sum_gb,
+      'mtime':mtime, 'file_name':file_name, 'owner':owner, 'full_path':full_path})
+    return True
+
+class SectionCache():
+  '''Rendered report sections, kept in a JSON file between runs, and reused
+  as long as a fingerprint of their inputs hasn't changed.  With no file,
+  everything is always rendered.'''
+  def __init__(self, path=None):
+    self.path = path
+    self.sections = {}
+    if path is not None and os.path.exists(path):
+      try:
+        with open(path) as f:
+          self.sections = json.load(f)
+      except ValueError:
+        pass
+  def get(self, name, fingerprint, render):
+    '''Return the section's HTML, only calling render if its fingerprint changed'''
+    fingerprint = json.dumps(fingerprint, default=str)
+    x = self.sections.get(name)
+    if x is not None and x['fingerprint'] == fingerprint:
+      return x['html']
+    html = str(render())
+    self.sections[name] = {'fingerprint':fingerprint, 'html':html, 'time':time.strftime('%c')}
+    return html
+  def save(self):
+    if self.path is None:
+      return
+    with open(self.path+'.tmp','w') as f:
+      json.dump(self.sections, f)
+    os.replace(self.path+'.tmp', self.path)
@@ -1,20 +1,138 @@
-#!/usr/bin/env python
-import os,sys
+#!/usr/bin/env python3
+#
+# Warn about filesystems getting full, from cron:
+#
+#   free.py 0.03        only print the ones with less than 3% free
+#   free.py 0.05 asdf   print all of them, warning below 5% free
+#
+# The mounts are checked concurrently, and a hung one is reported instead
+# of blocking forever.  Each run is added to a history file, to report the
+# fill rate and warn if one's projected to be full soon.
+#
 
-free_limit = float(sys.argv[1])
+import os
+import sys
+import json
+import time
+import threading
+import argparse
 
-for d in ['/work/clas12','/work/hallb/hps']:
+cli = argparse.ArgumentParser(description='Check free space of filesystems, with fill rates.')
+cli.add_argument('limit', type=float, help='warn if the free fraction is below this')
+cli.add_argument('verbose', nargs='?', default=None, help='anything, to print all filesystems')
+cli.add_argument('-mounts', default=['/work/clas12','/work/hallb/hps'], nargs='+', help='filesystems to check (default=%(default)s)')
+cli.add_argument('-timeout', default=30, type=float, help='seconds to wait for a filesystem (default=30)')
+cli.add_argument('-history', default=os.path.expanduser('~/.disk-free.json'), help='history file for fill rates (default=%(default)s)')
+cli.add_argument('-days', default=14, type=float, help='days of history to use for fill rates (default=14)')
+cli.add_argument('-minhours', default=48, type=float, help='hours of history needed for a fill rate (default=48)')
+cli.add_argument('-minsamples', default=3, type=int, help='samples needed for a fill rate (default=3)')
+cli.add_argument('-warndays', default=7, type=float, help='warn if projected to be full within this many days (default=7)')
+cli.add_argument('-json', default=False, action='store_true', help='print JSON instead')
 
-  x = os.statvfs(d)
+def statvfs(mounts, timeout):
+  '''Return statvfs of each mount, or None if it didn't answer in time.  The
+  threads are daemons, so hung ones don't keep us from exiting.'''
+  results = {}
+  def get(d):
+    try:
+      results[d] = os.statvfs(d)
+    except OSError as e:
+      results[d] = e
+  threads = [ threading.Thread(target=get, args=(d,), daemon=True) for d in mounts ]
+  for t in threads:
+    t.start()
+  deadline = time.time() + timeout
+  for t in threads:
+    t.join(max(0, deadline-time.time()))
+  return dict([ (d, results.get(d)) for d in mounts ])
 
-  free_frac = float(x.f_bfree) / x.f_blocks
+def read_history(path):
+  try:
+    with open(path) as f:
+      return json.load(f)
+  except (IOError, ValueError):
+    return {}
 
-  used_tb = float(x.f_blocks) * x.f_bsize/1e12
-  free_tb = float(x.f_bfree) * x.f_bsize/1e12
+def write_history(path, history):
+  try:
+    with open(path+'.tmp','w') as f:
+      json.dump(history, f)
+    os.replace(path+'.tmp', path)
+  except OSError as e:
+    print('WARNING:  cannot write history %s:  %s'%(path,e))
 
-  if len(sys.argv) > 2 or free_frac < free_limit:
-    fmt = '%s = %.2f%% free'
-    if free_frac < free_limit:
-      fmt = 'WARNING!!!!! ' + fmt
-    print(fmt%(d,100*free_frac))
+def fill_rate(samples, minhours, minsamples):
+  '''Return the least-squares fill rate in bytes per day of [time,used]
+  samples, or None if they're too few or too close together to trust'''
+  if len(samples) < max(2, minsamples):
+    return None
+  if samples[-1][0] - samples[0][0] < minhours*3600:
+    return None
+  n = float(len(samples))
+  mt = sum([ x[0] for x in samples ]) / n
+  mu = sum([ x[1] for x in samples ]) / n
+  var = sum([ (x[0]-mt)**2 for x in samples ])
+  if var == 0:
+    return None
+  return sum([ (x[0]-mt)*(x[1]-mu) for x in samples ]) / var * 86400
 
+def main(argv):
+  args = cli.parse_args(argv)
+  now = time.time()
+  history = read_history(args.history)
+  output = []
+  warned = False
+
+  for d,x in statvfs(args.mounts, args.timeout).items():
+
+    if x is None or isinstance(x, OSError):
+      error = 'not responding after %ds'%args.timeout if x is None else x.strerror
+      output.append({'mount':d, 'error':error})
+      warned = True
+      if not args.json:
+        print('WARNING!!!!! %s = %s'%(d,error))
+      continue
+
+    free_frac = float(x.f_bfree) / x.f_blocks
+
+    used_tb = float(x.f_blocks - x.f_bfree) * x.f_frsize/1e12
+    free_tb = float(x.f_bfree) * x.f_frsize/1e12
+
+    samples = [ s for s in history.get(d,[]) if s[0] > now - args.days*86400 ]
+    samples.append([now, used_tb*1e12])
+    history[d] = samples
+
+    rate = fill_rate(samples, args.minhours, args.minsamples)
+    days_to_full = None
+    if rate is not None and rate > 0:
+      days_to_full = free_tb*1e12 / rate
+
+    warn = free_frac < args.limit
+    if days_to_full is not None and days_to_full < args.warndays:
+      warn = True
+    warned = warned or warn
+
+    output.append({'mount':d, 'free_frac':free_frac, 'used_tb':used_tb, 'free_tb':free_tb,
+      'tb_per_day':None if rate is None else rate/1e12, 'days_to_full':days_to_full, 'warning':warn})
+
+    if not args.json and (args.verbose is not None or warn):
+      fmt = '%s = %.2f%% free'
+      if rate is not None:
+        fmt += ', %+.2f TB/day'%(rate/1e12)
+      if days_to_full is not None:
+        fmt += ', full in %.1f days'%days_to_full
+      if warn:
+        fmt = 'WARNING!!!!! ' + fmt
+      print(fmt%(d,100*free_frac))
+
+  write_history(args.history, history)
+
+  if args.json:
+    print(json.dumps(output, indent=2))
+
+  # don't wait on any hung threads, but still fail if anything's wrong:
+  sys.stdout.flush()
+  os._exit(1 if warned else 0)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -7,6 +7,7 @@ LIMIT=30
 
 # what's this for, probably perl or python?
 export PATH=/apps/bin:${PATH}
+export PYTHONPATH=/group/clas12/packages/mysql-connector/8.0.17/lib
 
 mkdir -p $OUTDIR
 cd $OUTDIR
@@ -17,16 +18,14 @@ date >> log
 
 for xx in rg-a rg-b rg-k rg-f rg-m rg-c users
 do
-    indir=$DISK
+    # incremental snapshots, only rewriting what changed since the last run:
+    rm -f $xx.log $xx.html
     if [ $xx == "users" ]
     then
-        cmd=$SCRIPTDIR/disk-database-users.pl
+        $SCRIPTDIR/disk_snapshot.py $DISK ${xx/-/} -prune "$DISK/rg-*" >& $xx.log
     else
-        indir=$indir/$xx
-        cmd=$SCRIPTDIR/disk-database.pl
+        $SCRIPTDIR/disk_snapshot.py $DISK/$xx ${xx/-/} >& $xx.log
     fi
-    rm -f $xx.log $xx.html
-    $cmd $indir/ ${xx/-/} >& $xx.log
     $SCRIPTDIR/disk-report.pl ${xx/-/} $LIMIT > $xx.html
 done
 
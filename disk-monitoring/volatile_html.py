@@ -1,146 +1,191 @@
-#!/usr/bin/env python
-import mysql.connector
+#!/usr/bin/env python3
+import os
 import time
 import sys
-import subprocess
+import threading
+import diskdb
+import diskreport
+import columnar
 
-path_prefix='/volatile/clas12'
-startSeconds = time.time()
-updateTime = time.strftime('%c')
 max_rows = 1e4
+rungroup_prefix = 'rg-'
 
-if len(sys.argv)>1:
-  path_prefix=sys.argv[1]
-
-# setup the database connection:
-db = mysql.connector.connect(
-  host="scidbw.jlab.org",
-  user="dummy",
-  passwd="",
-  database="wdm"
-)
-cursor = db.cursor()
-
-# get global info:
-query = 'select reserved, cached/1024./1024./1024. from projectDisk where root = "%s"'%path_prefix
-cursor.execute(query)
-result = cursor.fetchall()
-reserved = float(result[0][0])
-used = float(result[0][1])
-target_size = used - reserved
-if target_size < 1000.0:
-  target_size = 1000.0
-
-# get detailed info:
-query = 'select vfile.mod_time as mtime, file_name, vfile.owner, size, full_path'
-query += ' from vfile, vdirectory, projectDisk'
-query += ' where vfile.dir_index = vdirectory.dir_index'
-query += ' and projectDisk.disk_index = vdirectory.disk_index'
-query += ' and root = "%s"'%path_prefix
-query += ' order by mtime'
-cursor.execute(query)
-result = cursor.fetchall()
-
-# check for blacklisted directories:
-checked_dirs = []
-def is_dir_checked(d):
-  if d in checked_dirs:
-    return True
-  checked_dirs.append(d)
-  return False
-
-queue_lines = []
-count = 0
-count_dir = 0
-sum_gb = 0
-
-for i in range(len(result)):
-
-  count += 1
-  line_array = result[i]
-  sum_gb = float(line_array[3])/1024.0/1024.0/1024.0
-  this_dir = str(line_array[4])
-
-#  was thinking to parasitically get top level usage, but this 
-#  databse query is inappropriate for that:
-#  len_path_prefix = len(path_prefix.strip('/').split('/'))
-#  top_dir = this_dir.strip('/').split('/')[len_path_prefix]
-#  if top_dir not in top_sums:
-#    top_sums[top_dir] = 0
-#  top_sums[top_dir] += int(sum_gb)
-
-  # avoid checking the same dir twice, not sure why this is necssary:
-  if is_dir_checked(this_dir):
-    continue
-
-  # stop accumulating if we've already got sufficient data:
-  if sum_gb > target_size or count_dir > max_rows:
-    break
-
-  # accumulate the deletion queue, i.e. the oldest stuff:
-  count_dir += 1
-  line_str_array = []
-  for j in range(len(line_array)):
-    line_str_array.append(str(line_array[j]))
-  line = '<tr>'
-  line += '<td>%d</td>'%count_dir
-  line += '<td>%d</td>'%count
-  line += '<td>%.3f</td>'%sum_gb
-  line += '<td>%s</td>'%line_str_array[0]
-  line += '<td>%s</td>'%line_str_array[2]
-  line += '<td>%s</td>'%line_str_array[4].replace(path_prefix+'/','')
-  line += '<td>%s</td>'%line_str_array[1]
-  line += '</tr>'
-  queue_lines.append(line)
-
-# get top-level usage (this is the slowest part, so we limit to specific subdirs):
-# (if we could use the database to do this efficiently, that would be nice):
-top_sums = {}
-for x in 'a','b','c','f','k','m':
+def get_size(path):
+  '''Return the disk usage in bytes of a directory tree, like du'''
+  size = 0
   try:
-    y = subprocess.check_output(['du','-s',path_prefix+'/rg-'+x])
-    y = float(y.split().pop(0))/1024/1024/1024
-    top_sums['rg-'+x] = y
-  except:
+    for x in os.scandir(path):
+      if x.is_dir(follow_symlinks=False):
+        size += get_size(x.path)
+      else:
+        size += x.stat(follow_symlinks=False).st_blocks * 512
+  except OSError:
+    pass
+  return size
+
+def walk_tops(path_prefix):
+  '''Return the size in TB of the run-group directories below path_prefix
+  (or all of them if there are none), with one thread walking each'''
+  top_sums = {}
+  def walk_top(x):
+    top_sums[x] = float(get_size(path_prefix+'/'+x))/1024/1024/1024/1024
+  if os.path.isdir(path_prefix):
+    tops = [ x for x in os.listdir(path_prefix) if os.path.isdir(path_prefix+'/'+x) ]
+    if any([ x.startswith(rungroup_prefix) for x in tops ]):
+      tops = [ x for x in tops if x.startswith(rungroup_prefix) ]
+    threads = [ threading.Thread(target=walk_top, args=(x,)) for x in tops ]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+  return top_sums
+
+def get_usage(path_prefix):
+  '''Return the usage by directory just below path_prefix, e.g. run group,
+  and by owner, from one query grouped by both'''
+
+  # get top-level and owner usage, grouped by the first directory below
+  # path_prefix and owner, and add them up both ways:
+  top = 'substr(full_path, %d)'%(len(path_prefix)+2)
+  top = "case when instr(%s,'/')>0 then substr(%s,1,instr(%s,'/')-1) else %s end"%(top,top,top,top)
+  query = 'select top, owner, count(*), sum(size)/1024./1024./1024./1024. from ('
+  query += ' select %s as top, vfile.owner as owner, size'%top
+  query += ' from vfile, vdirectory, projectDisk'
+  query += ' where vfile.dir_index = vdirectory.dir_index'
+  query += ' and projectDisk.disk_index = vdirectory.disk_index'
+  query += ' and root = %s and full_path like %s'
+  query += ' ) as tops group by top, owner'
+  top_sums, top_counts = {}, {}
+  owner_sums, owner_counts = {}, {}
+  both = {}
+  try:
+    for x,owner,count,y in diskdb.fetchall(query, (path_prefix, path_prefix+'/%')):
+      if x:
+        top_sums[x] = top_sums.get(x,0) + float(y)
+        top_counts[x] = top_counts.get(x,0) + int(count)
+        owner_sums[owner] = owner_sums.get(owner,0) + float(y)
+        owner_counts[owner] = owner_counts.get(owner,0) + int(count)
+        both[(x,owner)] = float(y)
+  except diskdb.Error:
     pass
-fmt = '<tr><td>%s</td><td>%.1f</td></tr>'
-top_sums_lines = [ fmt%(x,top_sums[x]) for x in reversed(sorted(top_sums,key=top_sums.get)) ]
-
-# print header:
-print('<html>')
-print('<head><title>'+path_prefix+' Usage and Auto-Deletion Queue</title></head>')
-print('<body>')
-print('<h1>'+path_prefix+' Usage and Auto-Deletion Queue</h1>')
-print('<p> Last Updated: %s</p>'%updateTime)
-print('<p> Update Duration: %.1f minutes</p>'%((time.time()-startSeconds)/60))
-
-# print top-level usage:
-print('<h2>Usage Summary:</h2>')
-print('<table border>')
-print('<tr>')
-print('<th>subdirectory</th>')
-print('<th>size (TB)</th>')
-print('</tr>')
-print('\n'.join(top_sums_lines))
-print('</table>')
-
-# print auto-deletion queue:
-print('<h2>Auto-Deletion Queue:</h2>')
-print('<table border>')
-print('<tr>')
-print('<th>running directory count</th>')
-print('<th>running file count</th>')
-print('<th>running sum of <br/> size of old files (GB)</th>')
-print('<th>file mod time</th>')
-print('<th>file owner</th>')
-print('<th>directories with oldest files</th>')
-print('<th>oldest file in directory</th>')
-print('</tr>')
-print('\n'.join(queue_lines))
-print('</table>')
-
-# print footer
-print('</body>')
-print('</html>')
-
 
+  # if the database couldn't do it, walk the directories instead:
+  if len(top_sums) == 0:
+    top_sums = walk_tops(path_prefix)
+
+  def biggest(pairs, n=3):
+    pairs = sorted(pairs, key=lambda x: -x[1])[:n]
+    return ', '.join([ '%s (%.1f)'%(x,y) for x,y in pairs ])
+
+  table = diskreport.Table(['subdirectory','size (TB)','files','biggest owners (TB)'])
+  for x in reversed(sorted(top_sums,key=top_sums.get)):
+    table.add(x, '%.1f'%top_sums[x], top_counts.get(x,''),
+      biggest([ (o,y) for (t,o),y in both.items() if t == x ]))
+  html = str(table)
+
+  # the owners' usage, and which run groups it's in:
+  if len(owner_sums) > 0:
+    table = diskreport.Table(['owner','size (TB)','files','biggest subdirectories (TB)'])
+    for x in reversed(sorted(owner_sums,key=owner_sums.get)):
+      table.add(x, '%.1f'%owner_sums[x], owner_counts[x],
+        biggest([ (t,y) for (t,o),y in both.items() if o == x ]))
+    html += '\n<h2>Usage by Owner:</h2>\n' + str(table)
+
+  return html
+
+def get_queue(path_prefix, target_size):
+  '''Return the auto-deletion queue table'''
+
+  # get detailed info, in order of age, but only up to the file where the
+  # running sum passes target_size, since the queue can't use any more:
+  query = 'select mtime, file_name, owner, size, full_path from ('
+  query += ' select vfile.mod_time as mtime, file_name, vfile.owner, size, full_path,'
+  query += ' row_number() over w as file_count, sum(size) over w as sum_bytes'
+  query += ' from vfile, vdirectory, projectDisk'
+  query += ' where vfile.dir_index = vdirectory.dir_index'
+  query += ' and projectDisk.disk_index = vdirectory.disk_index'
+  query += ' and root = %s'
+  query += ' window w as (order by vfile.mod_time, vfile.file_index)'
+  query += ' ) as files where sum_bytes - size <= %s'
+  query += ' order by file_count'
+  result = diskdb.stream(query, (path_prefix, int(target_size*1024*1024*1024)))
+
+  # accumulate the deletion queue, i.e. the oldest stuff, until we've
+  # got sufficient data, checking each directory only once:
+  queue = diskreport.DeletionQueue(target_size, max_rows)
+
+  for line_array in result:
+    if not queue.add(*line_array):
+      break
+
+  # stop the query, if we didn't need all of it:
+  result.close()
+
+  table = diskreport.Table(['running directory count', 'running file count',
+    'running sum of <br/> size of old files (GB)', 'file mod time', 'file owner',
+    'directories with oldest files', 'oldest file in directory'])
+  for x in queue.rows:
+    table.add(x['count_dir'], x['count'], '%.3f'%x['sum_gb'], x['mtime'], x['owner'],
+      str(x['full_path']).replace(path_prefix+'/',''), x['file_name'])
+  return table
+
+def report(path_prefix, sections=None, export=None):
+
+  if sections is None:
+    sections = diskreport.SectionCache()
+
+  startSeconds = time.time()
+  updateTime = time.strftime('%c')
+
+  # get global info:
+  reserved, used = diskdb.get_project_disk(path_prefix)
+  target_size = used - reserved
+  if target_size < 1000.0:
+    target_size = 1000.0
+
+  # a cheap fingerprint of the inputs, one unordered pass instead of the
+  # sorting and grouping, to reuse sections if nothing changed:
+  query = 'select count(*), min(vfile.mod_time), max(vfile.mod_time), sum(size)'
+  query += ' from vfile, vdirectory, projectDisk'
+  query += ' where vfile.dir_index = vdirectory.dir_index'
+  query += ' and projectDisk.disk_index = vdirectory.disk_index'
+  query += ' and root = %s'
+  count, oldest, newest, total = diskdb.fetchall(query, (path_prefix,))[0]
+
+  usage = sections.get(path_prefix+':usage-owners', [count, newest, total],
+    lambda: get_usage(path_prefix))
+  queue = sections.get(path_prefix+':queue', [count, oldest, newest, total, target_size],
+    lambda: get_queue(path_prefix, target_size))
+
+  page = diskreport.Page(path_prefix+' Usage and Auto-Deletion Queue')
+  page.add('<p> Last Updated: %s</p>'%updateTime)
+  page.add('<p> Update Duration: %.1f minutes</p>'%((time.time()-startSeconds)/60))
+
+  # top-level usage:
+  page.add('<h2>Usage Summary:</h2>')
+  page.add(usage)
+
+  # auto-deletion queue:
+  page.add('<h2>Auto-Deletion Queue:</h2>')
+  page.add(queue)
+
+  # today's columnar snapshot, for offline analytics:
+  if export is not None:
+    query = 'select full_path, file_name, vfile.owner, size, vfile.mod_time'
+    query += ' from vfile, vdirectory, projectDisk'
+    query += ' where vfile.dir_index = vdirectory.dir_index'
+    query += ' and projectDisk.disk_index = vdirectory.disk_index'
+    query += ' and root = %s'
+    # (the report's still good without it)
+    try:
+      columnar.export(export, path_prefix, diskdb.stream(query, (path_prefix,)))
+    except Exception as e:
+      print('ERROR:  columnar export of %s failed:  %s'%(path_prefix,e), file=sys.stderr)
+
+  return page
+
+if __name__ == '__main__':
+  path_prefix='/volatile/clas12'
+  if len(sys.argv)>1:
+    path_prefix=sys.argv[1]
+  print(report(path_prefix))
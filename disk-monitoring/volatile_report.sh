@@ -9,16 +9,16 @@ export PYTHONPATH=/group/clas12/packages/mysql-connector/8.0.17/lib
 
 rm -f index.html cache.html hps-volatile.html hps-cache.html
 
-$SCRIPTDIR/volatile_html.py >& index.html
-scp index.html clas12@ifarm1901:/group/clas/www/clasweb/html/clas12offline/disk/volatile
-
-$SCRIPTDIR/cache_html.py >& cache.html
-scp cache.html clas12@ifarm1901:/group/clas/www/clasweb/html/clas12offline/disk/cache/index.html
-
-$SCRIPTDIR/volatile_html.py /volatile/hallb/hps >& hps-volatile.html
-scp hps-volatile.html hps@ifarm1901:/group/hps/www/hpsweb/html/disk/volatile/index.html
-
-# doing it from /cache/hallb/hps doesn't work, probably need to modify query
-$SCRIPTDIR/cache_html.py /cache/hallb >& hps-cache.html
-scp hps-cache.html hps@ifarm1901:/group/hps/www/hpsweb/html/disk/cache/index.html
-
+# one process, so the reports share a database connection and global queries,
+# and sections whose inputs didn't change are reused from the last run:
+# (doing it from /cache/hallb/hps doesn't work, probably need to modify query)
+$SCRIPTDIR/disk_reports.py -sections sections.json -export snapshots \
+  -volatile /volatile/clas12 index.html \
+  -cache /cache/clas12 cache.html \
+  -volatile /volatile/hallb/hps hps-volatile.html \
+  -cache /cache/hallb hps-cache.html
+
+if [ -e index.html ]; then scp index.html clas12@ifarm1901:/group/clas/www/clasweb/html/clas12offline/disk/volatile; fi
+if [ -e cache.html ]; then scp cache.html clas12@ifarm1901:/group/clas/www/clasweb/html/clas12offline/disk/cache/index.html; fi
+if [ -e hps-volatile.html ]; then scp hps-volatile.html hps@ifarm1901:/group/hps/www/hpsweb/html/disk/volatile/index.html; fi
+if [ -e hps-cache.html ]; then scp hps-cache.html hps@ifarm1901:/group/hps/www/hpsweb/html/disk/cache/index.html; fi
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+#
+# Synthetic-workload benchmarks for condor-probe.py, without a schedd.
+#
+# Generates a ClassAd dataset with realistic site, generator, status,
+# exit code and UserLog distributions, plus a fake log tree for a sample
+# of the jobs, and then times condor-probe's reading, munging, summaries,
+# table rendering and log checks on it.  The condor_q/condor_history
+# stand-ins in bin/ serve the same dataset, for benchmarking the query
+# path offline with -query.  With -startup, it also checks condor-probe's
+# startup time for lightweight invocations against a budget.
+#
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import resource
+import statistics
+import subprocess
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+probe_dir = os.path.dirname(bench_dir)
+sys.path.insert(0, probe_dir)
+
+# relative weights, roughly following the timeline and daily digests:
+site_weights = {'SU-ITS':6352, 'MIT':309, 'UConn':201, 'SGridGLA':157, 'UChicago':142,
+  'CNAF':86, 'ELSA':72, 'GRIF':55, 'Colorado':30, 'OSG_US_FSU_HNPGRID':26, 'PuertoRico':20,
+  'Cinvestav':11, 'BNL':7, 'UConn-HPC':6, 'KSU':4, 'SLATE_US_NMSU_DISCOVERY':4, 'CYBERA_EDMONTON':1}
+generator_weights = {'clasdis':30, 'lund':25, 'gemc':10, 'dvcsgen':10, 'genKYandOnePion':8,
+  'inclusive-dis-rad':7, 'tcsgen':5, 'jpsitcs':3, 'MCEGENpiN_radcorr':2}
+queue_status_weights = {1:60, 2:35, 5:5}
+history_status_weights = {4:97, 3:3}
+held_exit_weights = {202:35, 212:30, 204:15, 203:8, 207:5, 211:4, 0:3}
+users = ['jnewton','mungaro','devita','baltzell','mckinnon','hatta','kenjo','sdiehl',
+  'pilleux','tyson','ziegler','bclary','rcruz','jzhang','avakian','kjoo']
+
+def weighted(rng, weights):
+  return rng.choices(list(weights.keys()), weights=list(weights.values()))[0]
+
+def make_job(rng, now, gemc, cluster, proc, nprocs, user, site, logdir, completed):
+  '''Create one job's ClassAd with the attributes condor-probe uses'''
+  qdate = now - rng.randint(3600, 5*86400)
+  status = weighted(rng, history_status_weights if completed else queue_status_weights)
+  starts = 0 if status == 1 else min(16, 1 + int(rng.expovariate(2.5)))
+  wall = rng.lognormvariate(1.6, 0.5)*3600
+  util = min(1.0, rng.betavariate(8, 1.5))
+  job = {
+    'Args': '%d %d'%(gemc, proc),
+    'ClusterId': cluster,
+    'ProcId': proc,
+    'QDate': qdate,
+    'JobStatus': status,
+    'TotalSubmitProcs': nprocs,
+    'NumJobStarts': starts,
+    'UserLog': '%s/job.%d.%d.log'%(logdir, cluster, proc),
+    'ExitBySignal': False,
+    'JobCurrentStartDate': 0,
+    'CompletionDate': 0,
+    'RemoteUserCpu': 0.0,
+    'CumulativeSlotTime': 0.0,
+    'CumulativeRemoteUserCpu': 0.0,
+  }
+  if starts > 0:
+    host = 'glidein_%d_%d@%s-node%03d.%s.edu'%(rng.randint(1,9999), rng.randint(1,9999),
+      site.lower(), rng.randint(1,300), site.lower())
+    job['MATCH_GLIDEIN_Site'] = site
+    job['LastRemoteHost'] = host
+    job['CumulativeSlotTime'] = wall*(starts-1)*rng.random() + wall
+    job['CumulativeRemoteUserCpu'] = job['CumulativeSlotTime']*util*rng.uniform(0.5, 1)
+  if status == 2:
+    job['RemoteHost'] = job['LastRemoteHost']
+    job['JobCurrentStartDate'] = now - int(min(wall, now-qdate))
+    job['RemoteUserCpu'] = (now - job['JobCurrentStartDate'])*util
+  elif status in (3, 4):
+    job['CompletionDate'] = now - rng.randint(0, 7*86400)
+    job['JobCurrentStartDate'] = job['CompletionDate'] - int(wall)
+    job['RemoteUserCpu'] = wall*util
+    job['ExitCode'] = 0
+  elif status == 5:
+    job['ExitCode'] = weighted(rng, held_exit_weights)
+  return job
+
+def generate(path, njobs, nlogs, seed):
+  '''Write the dataset to path/jobs.json, and logs for nlogs jobs under path/osgpool'''
+  rng = random.Random(seed)
+  now = int(time.time())
+  jobs = []
+  gemc = 1000
+  cluster = 3000000
+  while len(jobs) < njobs:
+    gemc += 1
+    cluster += rng.randint(1, 20)
+    nprocs = min(njobs - len(jobs), rng.choice([10, 100, 500, 1000, 2000, 5000]))
+    user = rng.choice(users)
+    generator = weighted(rng, generator_weights)
+    completed = rng.random() < 0.5
+    subdir = '%s/osgpool/%s/job_%d'%(path, user, gemc)
+    logdir = subdir + '/log'
+    for proc in range(nprocs):
+      job = make_job(rng, now, gemc, cluster, proc, nprocs, user, weighted(rng, site_weights), logdir, completed)
+      job['generator'] = generator
+      jobs.append(job)
+  # write logs for a random sample, including the exit codes and CVMFS
+  # errors that -parseexit and -cvmfs look for:
+  for job in rng.sample(jobs, min(nlogs, len(jobs))):
+    logdir = os.path.dirname(job['UserLog'])
+    os.makedirs(logdir, exist_ok=True)
+    script = os.path.dirname(logdir) + '/nodeScript.sh'
+    if not os.path.exists(script):
+      with open(script,'w') as f:
+        f.write('#!/bin/bash\n' + 'echo setup\n'*50)
+        f.write('echo Running 10000 events with generator clas12-%s with options\n'%job['generator'])
+    stem = job['UserLog'][0:-4]
+    with open(job['UserLog'],'w') as f:
+      f.write('000 (%d.%03d.000) Job submitted from host\n...\n'%(job['ClusterId'],job['ProcId'])*20)
+    with open(stem+'.out','w') as f:
+      f.write('event processed\n'*2000)
+      if job.get('ExitCode') == 202:
+        f.write('CVMFS ERROR: Loaded environment state is inconsistent\n')
+    with open(stem+'.err','w') as f:
+      f.write('warning: something\n'*50)
+      if job.get('ExitCode') is not None:
+        f.write('exit %d\n'%job['ExitCode'])
+  for job in jobs:
+    job.pop('generator')
+  with open(path+'/jobs.json','w') as f:
+    json.dump(jobs, f)
+  return len(jobs)
+
+###########################################################
+###########################################################
+
+def reset(probe):
+  '''Clear condor-probe's global caches between stages'''
+  probe.condor_data = probe.collections.OrderedDict()
+  probe.condor_data_tallies = probe.new_tally()
+  probe.condor_matcher = None
+  probe.generators.clear()
+  probe.tables.clear()
+
+def make_args(*argv):
+  '''Parse condor-probe options, with -end defaulting to now'''
+  import condorprobe
+  args = condorprobe.get_cli().parse_args(argv)
+  args.end = datetime.datetime.now()
+  return args
+
+class Stage():
+  def __init__(self, name, items):
+    self.name = name
+    self.items = items
+  def __enter__(self):
+    self.wall = time.perf_counter()
+    self.cpu = time.process_time()
+    return self
+  def __exit__(self, *exc):
+    self.wall = time.perf_counter() - self.wall
+    self.cpu = time.process_time() - self.cpu
+    self.maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+    print('%-18s %10d %9.3f %9.3f %12.0f %10.1f'%(self.name, self.items,
+      self.wall, self.cpu, self.items/max(self.wall,1e-9), self.maxrss))
+    sys.stdout.flush()
+    return False
+
+def benchmark(path, query):
+  import condorprobe as probe
+  path = os.path.abspath(path)
+  jobs_path = path + '/jobs.json'
+  print('%-18s %10s %9s %9s %12s %10s'%('stage','items','wall(s)','cpu(s)','items/s','maxrss(MB)'))
+  print(''.ljust(72,'-'))
+
+  # reading from a file includes JSON parsing and munging:
+  reset(probe)
+  args = make_args('-input', jobs_path)
+  with Stage('read+munge', 0) as s:
+    probe.condor_read(args)
+    s.items = len(probe.condor_data)
+  njobs = len(probe.condor_data)
+
+  reset(probe)
+  for x in json.load(open(jobs_path)):
+    probe.condor_data['%d.%d'%(x['ClusterId'],x['ProcId'])] = x
+  with Stage('munge', njobs):
+    probe.condor_munge(args)
+
+  with Stage('match', njobs):
+    for x in probe.condor_yield(args):
+      pass
+
+  with Stage('cluster summary', njobs):
+    summary = probe.condor_cluster_summary(args)
+
+  with Stage('site summary', njobs):
+    sites = probe.condor_site_summary(args)
+
+  with Stage('exit summary', njobs):
+    probe.condor_exit_code_summary(args)
+
+  with Stage('efficiency', njobs):
+    probe.condor_efficiency_summary()
+
+  with Stage('job table', njobs):
+    for cid,job in probe.condor_yield(args):
+      probe.get_table('job').add_job(job)
+    str(probe.get_table('job'))
+
+  with Stage('summary tables', len(summary)+len(sites)):
+    str(probe.get_table('summary').add_jobs(summary))
+    str(probe.get_table('site').add_jobs(sites))
+
+  # log checks only hit the filesystem for jobs with logs, but
+  # every held job's logs are looked for:
+  held = [job for cid,job in probe.condor_yield(make_args('-held'))]
+  with Stage('parseexit', len(held)):
+    for job in held:
+      probe.get_exit_code(job)
+  with Stage('cvmfs', len(held)):
+    for job in held:
+      probe.check_cvmfs(job)
+
+  if query:
+    reset(probe)
+    os.environ['PATH'] = bench_dir + '/bin:' + os.environ.get('PATH')
+    os.environ['CONDOR_BENCH_DATA'] = jobs_path
+    args = make_args('-hours', str(7*24))
+    with Stage('query+munge', 0) as s:
+      probe.condor_query(args)
+      s.items = len(probe.condor_data)
+
+def startup(budget, repeats):
+  '''Time whole condor-probe invocations of lightweight modes, returning
+  whether the median of each is within the budget in milliseconds'''
+  ok = True
+  probe = os.path.join(probe_dir, 'condor-probe.py')
+  print('%-40s %10s %10s'%('startup','median(ms)','max(ms)'))
+  print(''.ljust(62,'-'))
+  for argv in (['-c','pass'], [probe,'-printexit'], [probe,'-h']):
+    times = []
+    for i in range(repeats):
+      start = time.perf_counter()
+      subprocess.run([sys.executable]+argv, stdout=subprocess.DEVNULL)
+      times.append(1000*(time.perf_counter()-start))
+    median = statistics.median(times)
+    name = ' '.join(['python3']+[os.path.basename(x) for x in argv])
+    if argv[0] == probe and median > budget:
+      ok = False
+      name += ' (OVER BUDGET)'
+    print('%-40s %10.1f %10.1f'%(name, median, max(times)))
+  return ok
+
+if __name__ == '__main__':
+
+  cli = argparse.ArgumentParser(description='Benchmark condor-probe on synthetic condor data.',
+      epilog='''Typical dataset sizes are 10000, 100000 and 1000000 jobs.  The dataset is only
+      generated if DIR does not already contain one, unless -regenerate is specified.''')
+  cli.add_argument('-dir', default=None, metavar='DIR', type=str, help='directory for the dataset and fake logs')
+  cli.add_argument('-jobs', default=10000, metavar='#', type=int, help='number of jobs to generate (default=10000)')
+  cli.add_argument('-logs', default=2000, metavar='#', type=int, help='number of jobs to generate logs for (default=2000)')
+  cli.add_argument('-seed', default=12, metavar='#', type=int, help='random seed (default=12)')
+  cli.add_argument('-regenerate', default=False, action='store_true', help='regenerate the dataset even if it exists')
+  cli.add_argument('-generate', default=False, action='store_true', help='just generate the dataset, no benchmarks')
+  cli.add_argument('-query', default=False, action='store_true', help='also benchmark querying via the condor_q/condor_history stand-ins')
+  cli.add_argument('-startup', default=False, action='store_true', help='benchmark startup time of lightweight modes')
+  cli.add_argument('-budget', default=50, metavar='#', type=float, help='startup time budget in milliseconds (default=50)')
+
+  args = cli.parse_args(sys.argv[1:])
+
+  if args.startup:
+    if not startup(args.budget, 20):
+      sys.exit(1)
+    if args.dir is None:
+      sys.exit(0)
+
+  if args.dir is None:
+    cli.error('-dir is required unless using -startup.')
+
+  if args.regenerate or not os.path.exists(args.dir+'/jobs.json'):
+    os.makedirs(args.dir, exist_ok=True)
+    start = time.perf_counter()
+    n = generate(args.dir, args.jobs, args.logs, args.seed)
+    print('Generated %d jobs in %s in %.1f seconds.'%(n, args.dir, time.perf_counter()-start))
+
+  if not args.generate:
+    benchmark(args.dir, args.query)
@@ -4,6 +4,8 @@ d=`/usr/bin/readlink -f $0`
 d=`/usr/bin/dirname $d`
 
 $d/condor-probe.py -timeline
+$d/condor-probe.py -trendupdate -completed -hours 2
+$d/condor-probe.py -healthupdate -hours 2
 $d/check-cvmfs.sh
 $d/check-xrootd.sh
 $d/vacate-stalls.sh
@@ -37,6 +37,10 @@ echo Vacated jobs in the past 24 hours: >> $emailbody
 munge $vacate_cache >> $emailbody
 echo >> $emailbody
 
+echo Worst nodes by decayed health index: >> $emailbody
+$dirname/condor-probe.py -health 20 >> $emailbody
+echo >> $emailbody
+
 rm -f $cvmfs_cache $xrootd_cache $vacate_cache
 
 export DISPLAY=:0.0
@@ -0,0 +1,713 @@
+#
+# The implementation of disk-cleanup.py, also used by transfer.py to
+# share its single crawl of the filesystem.
+#
+
+import re
+import os
+import sys
+import time
+import json
+import contextlib
+import collections
+import gzip
+import stat
+import errno
+import sqlite3
+import atexit
+import argparse
+import threading
+import concurrent.futures
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+protected_dirs = [ '/osgpool/hallb/clas12/gemc' , '/volatile/clas12/osg2' ]
+default_ignores = [ r'^.*\.hipo$', r'^.*/job_[0-9]+/nodeScript.sh$' ]
+default_trashes = [ r'.*\.root$', r'.*\.evio$', r'^core\.*' ]
+
+def get_cli():
+  cli = argparse.ArgumentParser(description='''Utility for filesystem cleanup.
+    Defaults values of the -ignores and -trashes options are for CLAS12 OSG cleanup.
+    Note, this preserves directory modification times, unlike a `find -delete.`
+    ''')
+  cli.add_argument('-path', required=True, type=str, help='path to search recursively for deletions')
+  cli.add_argument('-delete', default=-1, metavar='#', type=int, help='age threshold in days for file deletion (default=inf)')
+  cli.add_argument('-empty', default=-1, metavar='#', type=int, help='age threshold in days for empty directory deletion (default=inf)')
+  cli.add_argument('-trash', default=-1, metavar='#', type=int, help='age threshold in days for trash deletion (default=inf)')
+  cli.add_argument('-gzip', default=False, action='store_true', help='gzip files instead of deleting')
+  cli.add_argument('-zstd', default=False, action='store_true', help='use zstd instead of gzip for -gzip (requires the zstandard module)')
+  cli.add_argument('-gzipworkers', default=2, metavar='#', type=int, help='number of files to compress in parallel for -gzip (default=2)')
+  cli.add_argument('-gziprate', default=0, metavar='#', type=float, help='input MB/s limit per -gzip worker (default=unlimited)')
+  cli.add_argument('-ignores', default=[], type=str, action='append', help='regular expressions of paths to ignore, repeatable (default=%s)'%default_ignores)
+  cli.add_argument('-trashes', default=[], type=str, action='append', help='regular expressions of file basenames to always delete, repeatable (default=%s)'%default_trashes)
+  cli.add_argument('-noignores', default=False, action='store_true', help='disable the -ignores option')
+  cli.add_argument('-notrashes', default=False, action='store_true', help='disable the -trashes option')
+  cli.add_argument('-dryrun', default=False, action='store_true', help='do not delete/gzip anything, just print')
+  cli.add_argument('-report', default=None, choices=['json','table'], help='print bytes and counts of deletions by rule, top-level directory, and age')
+  cli.add_argument('-index', default=None, metavar='PATH', type=str, help='SQLite file caching directory listings between runs, so only directories with a new mtime get rescanned')
+  cli.add_argument('-rate', default=0, metavar='#', type=float, help='maximum deletions per second, backing off while slow (default=unlimited)')
+  cli.add_argument('-latency', default=100, metavar='#', type=float, help='deletion latency in ms above which -rate backs off (default=100)')
+  cli.add_argument('-unlinkers', default=1, metavar='#', type=int, help='number of subtrees to do deletions in concurrently (default=1)')
+  cli.add_argument('-checkpoint', default=None, metavar='PATH', type=str, help='file of finished subtrees, to skip them when resuming an interrupted run')
+  cli.add_argument('-threads', default=1, metavar='#', type=int, help='number of threads crawling subtrees in parallel (default=1)')
+  cli.add_argument('-split', default=2, metavar='#', type=int, help='directory depth of the subtrees given to each thread, e.g. user/job_N (default=2)')
+  return cli
+
+########################################################################
+########################################################################
+
+def cleanup(dryrun,deletes,report=None):
+  if report is not None:
+    print('\n'+str(report))
+  if dryrun:
+    print('\nWould have deleted %d things.'%len(deletes))
+  else:
+    print('\nDeleted %d things.'%len(deletes))
+
+########################################################################
+########################################################################
+
+def is_old(mtime, days):
+  '''Check whether modification time is older than than a number of days'''
+  age_days = float(now - mtime)/60/60/24
+  return age_days > days
+
+def get_literal(regex):
+  '''Return the plain string a regex matches, or None if it's not one'''
+  ret = ''
+  escaped = False
+  for c in regex:
+    if escaped:
+      if c.isalnum():
+        return None
+      ret += c
+      escaped = False
+    elif c == '\\':
+      escaped = True
+    elif c in '.^$*+?{}[]|()':
+      return None
+    else:
+      ret += c
+  return None if escaped else ret
+
+class Matcher():
+  '''Equivalent to re.fullmatch against any of a list of regexes, but
+  compiled once, with the common forms ^.*xxx$, ^xxx.*$, and ^xxx$ (for
+  plain strings xxx) done by string comparison, and the rest compiled
+  separately, since inline flags and backreferences don't survive being
+  combined into one alternation'''
+  def __init__(self, regexes):
+    self.suffixes = []
+    self.prefixes = []
+    self.literals = set()
+    self.others = []
+    self.regexes = list(regexes)
+    for x in regexes:
+      y = x
+      if y.startswith('^'):
+        y = y[1:]
+      if y.endswith('$') and not y.endswith('\\$'):
+        y = y[:-1]
+      if y.startswith('.*') and get_literal(y[2:]) is not None:
+        self.suffixes.append(get_literal(y[2:]))
+      elif y.endswith('.*') and get_literal(y[:-2]) is not None:
+        self.prefixes.append(get_literal(y[:-2]))
+      elif get_literal(y) is not None:
+        self.literals.add(get_literal(y))
+      else:
+        self.others.append(re.compile(x))
+    self.suffixes = tuple(self.suffixes)
+    self.prefixes = tuple(self.prefixes)
+  def match(self, string):
+    # .* doesn't match newlines, so leave those to the original regexes:
+    if '\n' in string:
+      return any(re.fullmatch(x, string) for x in self.regexes)
+    if string.endswith(self.suffixes) or string.startswith(self.prefixes):
+      return True
+    if string in self.literals:
+      return True
+    return any(x.fullmatch(string) for x in self.others)
+
+def is_trash(path):
+  '''Test whether it qualifies as trash'''
+  return trashes.match(path[path.rfind('/')+1:])
+
+def is_ignored(path):
+  '''Test whether it qualifies for being ignored'''
+  return ignores.match(path)
+
+########################################################################
+########################################################################
+
+def should_delete_file(path, mtime):
+  '''Return the rule the file should be deleted by, or None'''
+  if args.trash>0 and is_old(mtime, args.trash) and is_trash(path):
+    return 'trash'
+  if args.delete>0 and is_old(mtime, args.delete) and not is_ignored(path):
+    return 'delete'
+  return None
+
+def should_delete_dir(path, mtime):
+  '''Test whether the (already empty) directory should be deleted'''
+  return args.empty>0 and is_old(mtime, args.empty)
+
+########################################################################
+########################################################################
+
+def vanishing():
+  '''Ignore files disappearing while we're at them, which happens if
+  something else is deleting stuff, e.g. rsync tempfiles from incoming
+  LUND files'''
+  return contextlib.suppress(FileNotFoundError)
+
+def execute(actions):
+  '''Print and (unless a dryrun) perform a batch of deletions in order'''
+  for action,path,mtime in actions:
+    try:
+      with vanishing():
+        if action == 'utime':
+          if not args.dryrun:
+            os.utime(path, (mtime, mtime))
+          continue
+        print(path)
+        deletes.append(path)
+        if args.dryrun:
+          continue
+        if action == 'gzip':
+          compressor.submit(path, mtime)
+          continue
+        deleter.throttle()
+        start = time.time()
+        if action == 'remove':
+          os.remove(path)
+        elif action == 'rmdir':
+          os.rmdir(path)
+        deleter.measure(time.time() - start)
+    except OSError:
+      # a directory that got repopulated since it was crawled
+      if action != 'rmdir':
+        raise
+
+class Deleter():
+  '''The stage that performs everything the crawlers decide.  Each batch
+  (a subtree's) is done in order, so children always go before their
+  parents and directory mtimes are restored after their contents are
+  deleted, with up to -unlinkers batches at once, paced to at most -rate
+  deletions per second.  While deletions take longer than -latency, the
+  rate is halved every second, and otherwise creeps back up to -rate.
+  With hold, batches are only kept until release().'''
+  def __init__(self, workers, rate, latency, checkpoint, hold=False):
+    self.pool = None
+    self.held = [] if hold else None
+    self.futures = []
+    # (with -threads, this also keeps the crawlers from waiting on it)
+    if workers > 1 or args.threads > 1:
+      self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+    self.lock = threading.Lock()
+    self.max_rate = rate
+    self.rate = rate
+    self.latency = latency
+    self.average = 0
+    self.next_time = time.time()
+    self.adjust_time = time.time()
+    self.checkpoint = checkpoint
+    self.completed = set()
+    if checkpoint is not None and os.path.exists(checkpoint):
+      with open(checkpoint,'r') as f:
+        self.completed.update(x.rstrip('\n') for x in f)
+      print('Resuming from checkpoint with %d completed subtrees.'%len(self.completed))
+  def throttle(self):
+    '''Wait until the next deletion is allowed by the current rate'''
+    if self.max_rate <= 0:
+      return
+    with self.lock:
+      t = time.time()
+      delay = self.next_time - t
+      self.next_time = max(self.next_time, t) + 1.0/self.rate
+    if delay > 0:
+      time.sleep(delay)
+  def measure(self, seconds):
+    '''Adjust the rate based on how long a deletion took'''
+    if self.max_rate <= 0:
+      return
+    with self.lock:
+      self.average = 0.9*self.average + 0.1*seconds
+      t = time.time()
+      if t - self.adjust_time > 1:
+        self.adjust_time = t
+        if self.average > self.latency:
+          self.rate = max(1.0, self.rate/2)
+        else:
+          self.rate = min(self.max_rate, self.rate + self.max_rate/20)
+  def run(self, actions, subtree):
+    execute(actions)
+    if subtree is not None and self.checkpoint is not None and not args.dryrun:
+      with self.lock:
+        with open(self.checkpoint,'a') as f:
+          f.write(subtree+'\n')
+  def submit(self, actions, subtree=None):
+    if self.held is not None:
+      with self.lock:
+        self.held.append((actions, subtree))
+    elif self.pool is None:
+      self.run(actions, subtree)
+    else:
+      self.futures.append(self.pool.submit(self.run, actions, subtree))
+  def release(self):
+    '''Start on the batches held so far, in order, and stop holding'''
+    held, self.held = self.held, None
+    for actions,subtree in held or []:
+      self.submit(actions, subtree)
+  def wait(self):
+    for f in self.futures:
+      f.result()
+    self.futures.clear()
+  def finish(self):
+    '''Forget the checkpoint, after everything got done'''
+    if self.checkpoint is not None and os.path.exists(self.checkpoint):
+      os.remove(self.checkpoint)
+
+########################################################################
+########################################################################
+
+compressed_suffixes = ('.gz', '.zst')
+
+def compress(path, dirpath_mtime):
+  '''Compress a file into path.gz (or .zst), atomically and with the same
+  mode, ownership, and times, at gzip's default level, then remove it and
+  restore its directory's modification time, even if it failed.  Like
+  gzip, an existing path.gz is never overwritten.'''
+  suffix = '.zst' if args.zstd else '.gz'
+  tmppath = path + suffix + '.tmp'
+  if os.path.lexists(path+suffix):
+    raise FileExistsError(errno.EEXIST, 'already exists, not compressing', path+suffix)
+  st = os.stat(path)
+  try:
+    with open(path, 'rb') as fin, open(tmppath, 'wb') as fout:
+      if args.zstd:
+        zout = zstandard.ZstdCompressor().stream_writer(fout)
+      else:
+        zout = gzip.GzipFile(os.path.basename(path), 'wb', 6, fout, st.st_mtime)
+      with zout:
+        nbytes = 0
+        start = time.time()
+        while True:
+          data = fin.read(1<<20)
+          if not data:
+            break
+          zout.write(data)
+          nbytes += len(data)
+          # throttle to -gziprate, on average since the start:
+          if args.gziprate > 0:
+            ahead = nbytes/args.gziprate/1e6 - (time.time()-start)
+            if ahead > 0:
+              time.sleep(ahead)
+    os.chmod(tmppath, stat.S_IMODE(st.st_mode))
+    try:
+      os.chown(tmppath, st.st_uid, st.st_gid)
+    except PermissionError:
+      pass
+    os.utime(tmppath, ns=(st.st_atime_ns, st.st_mtime_ns))
+    # (a link, unlike a rename, fails if something appeared there since)
+    os.link(tmppath, path+suffix)
+    os.remove(tmppath)
+    os.remove(path)
+  except:
+    if os.path.exists(tmppath):
+      os.remove(tmppath)
+    raise
+  finally:
+    with vanishing():
+      os.utime(os.path.dirname(path), (dirpath_mtime, dirpath_mtime))
+
+class Compressor():
+  '''Compress files in the background, on a pool of -gzipworkers threads
+  (zlib and zstd release the GIL while compressing), with a bounded queue
+  so the crawl only waits when the compressors are far behind'''
+  def __init__(self, workers):
+    self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+    self.queue = threading.BoundedSemaphore(1000*workers)
+    self.errors = 0
+  def submit(self, path, dirpath_mtime):
+    self.queue.acquire()
+    self.pool.submit(compress, path, dirpath_mtime).add_done_callback(self.done)
+  def done(self, future):
+    self.queue.release()
+    e = future.exception()
+    if e is not None and not isinstance(e, FileNotFoundError):
+      print('Compression error:  %s'%e, file=sys.stderr)
+      self.errors += 1
+  def wait(self):
+    self.pool.shutdown(wait=True)
+
+########################################################################
+########################################################################
+
+age_buckets = [ 1, 2, 7, 30, 90, 365 ]
+
+def format_bytes(nbytes):
+  for units in ['B','KB','MB','GB','TB']:
+    if nbytes < 1024 or units == 'TB':
+      break
+    nbytes /= 1024
+  if units == 'B':
+    return '%d B'%nbytes
+  return '%.1f %s'%(nbytes,units)
+
+class Report():
+  '''Bytes and counts of deletions by rule, by top-level (user) directory
+  under -path, and by age, accumulated from the crawl's stats as it goes'''
+  def __init__(self, top):
+    self.top = top.rstrip('/') + '/'
+    self.lock = threading.Lock()
+    self.groups = collections.OrderedDict()
+    for x in ['rule','user','age']:
+      self.groups[x] = {}
+  def get_age(self, mtime):
+    days = float(now - mtime)/60/60/24
+    lower = 0
+    for upper in age_buckets:
+      if days < upper:
+        return '%d-%dd'%(lower,upper)
+      lower = upper
+    return '>%dd'%lower
+  def add(self, rule, path, size, mtime):
+    user = '-'
+    if path.startswith(self.top):
+      user = path[len(self.top):].split('/').pop(0)
+    with self.lock:
+      for group,key in zip(self.groups, [rule, user, self.get_age(mtime)]):
+        x = self.groups[group].setdefault(key, {'count':0, 'bytes':0})
+        x['count'] += 1
+        x['bytes'] += size
+  def __str__(self):
+    if args.report == 'json':
+      return json.dumps(self.groups, indent=2)
+    lines = []
+    fmt = '%-6s %-32s %10s %12s'
+    for group,totals in self.groups.items():
+      lines.append(fmt%(group,'','count','bytes'))
+      for key,x in sorted(totals.items(), key=lambda x: -x[1]['bytes']):
+        lines.append(fmt%('',key,x['count'],format_bytes(x['bytes'])))
+    return '\n'.join(lines)
+
+class Index():
+  '''An SQLite cache of directory listings, (path, mtime, size, type) for
+  each entry, and the mtime of each directory when it was last scanned'''
+  def __init__(self, path):
+    self.lock = threading.Lock()
+    self.db = sqlite3.connect(path, check_same_thread=False)
+    self.db.execute('pragma synchronous = off')
+    self.db.execute('''create table if not exists entries (path text primary key,
+      parent text, mtime real, size integer, type text)''')
+    self.db.execute('create index if not exists entries_parent on entries (parent)')
+    self.db.execute('create table if not exists scans (path text primary key, mtime real)')
+    self.changes = 0
+  def get(self, dirpath, dirpath_mtime):
+    '''Return the indexed listing if the directory is unchanged since it was scanned'''
+    with self.lock:
+      row = self.db.execute('select mtime from scans where path = ?', (dirpath,)).fetchone()
+      if row is None or row[0] != dirpath_mtime:
+        return None
+      sql = 'select path,type,mtime,size from entries where parent = ?'
+      return self.db.execute(sql, (dirpath,)).fetchall()
+  def put(self, dirpath, dirpath_mtime, entries):
+    with self.lock:
+      self.db.execute('delete from entries where parent = ?', (dirpath,))
+      rows = [ (os.path.join(dirpath,x[0]), dirpath, x[2], x[3], x[1]) for x in entries ]
+      self.db.executemany('insert or replace into entries values (?,?,?,?,?)', rows)
+      self.db.execute('insert or replace into scans values (?,?)', (dirpath, dirpath_mtime))
+      self.commit(len(rows))
+  def invalidate(self, dirpath):
+    with self.lock:
+      self.db.execute('delete from scans where path = ?', (dirpath,))
+      self.commit(1)
+  def forget(self, dirpath):
+    '''Remove a deleted directory and everything indexed below it'''
+    with self.lock:
+      # ('0' sorts right after '/', so this is everything in dirpath/)
+      for table in ['entries','scans']:
+        sql = 'delete from %s where path = ? or (path > ? and path < ?)'%table
+        self.db.execute(sql, (dirpath, dirpath+'/', dirpath+'0'))
+      self.commit(1)
+  def commit(self, changes):
+    self.changes += changes
+    if self.changes > 100000:
+      self.db.commit()
+      self.changes = 0
+  def close(self):
+    with self.lock:
+      self.db.commit()
+      self.db.close()
+
+def scan_dir(dirpath):
+  '''Return (name, type, mtime, size) for each entry in a directory, with
+  type d for directories, l for symlinks to them, and f for anything else'''
+  ret = []
+  with os.scandir(dirpath) as it:
+    for entry in it:
+      with vanishing():
+        if entry.is_dir():
+          kind = 'l' if entry.is_symlink() else 'd'
+        else:
+          kind = 'f'
+        st = entry.stat()
+        ret.append((entry.name, kind, st.st_mtime, st.st_size))
+  return ret
+
+def list_dir(dirpath, dirpath_mtime):
+  '''Return (name, type, mtime, size, fresh) for each entry in a directory,
+  from the -index if it's unchanged, else by scanning it, or None if it's
+  unreadable.  Indexed file mtimes may be stale (fresh=False), since only
+  changes to a directory's list of entries change its mtime.'''
+  if index is not None:
+    rows = index.get(dirpath, dirpath_mtime)
+    if rows is not None:
+      ret = []
+      for path,kind,mtime,size in rows:
+        # subdirectory mtimes are needed to know whether to rescan them:
+        if kind == 'd':
+          try:
+            mtime = os.stat(path).st_mtime
+          except FileNotFoundError:
+            continue
+        ret.append((os.path.basename(path), kind, mtime, size, kind=='d'))
+      return ret
+  try:
+    entries = scan_dir(dirpath)
+  except OSError:
+    return None
+  if index is not None:
+    index.put(dirpath, dirpath_mtime, entries)
+  return [ x+(True,) for x in entries ]
+
+class Pending():
+  '''A directory above the -split depth, crawled but not yet finished'''
+  def __init__(self, finish):
+    self.finish = finish
+
+def crawl(dirpath, dirpath_mtime, actions, depth=0):
+  '''Crawl one directory bottom-up, deciding on its files and then any
+  subdirectories that got emptied, appending the resulting actions in
+  order, and return the number of entries that will be left'''
+
+  remaining = 0
+  subdirs = []
+  dir_got_modified = False
+  dir_got_compressed = False
+
+  # don't delete anything at the top level within protected_dir:
+  # (this is to avoid race conditions from the OSG submit portal)
+  protected = dirpath in protected_dirs
+
+  entries = list_dir(dirpath, dirpath_mtime)
+
+  # unreadable or already gone, so never consider it empty:
+  if entries is None:
+    return 1
+
+  for name,kind,mtime,size,fresh in entries:
+    fullpath = dirpath+'/'+name
+    try:
+
+      # recurse into directories, and deal with them after files:
+      # (symlinks are not followed, same as os.walk)
+      if kind == 'd':
+        path = os.path.join(dirpath,name)
+        left = descend(path, mtime, actions, depth+1)
+        subdirs.append((fullpath, path, mtime, left))
+        continue
+
+      # let any other user of this crawl see the file first:
+      if kind == 'f' and on_file is not None:
+        on_file(fullpath, depth+1)
+
+      # deal with files, with the stat from the directory scan, but
+      # if that came from the index, check again before deleting:
+      if kind == 'f' and not protected:
+        rule = should_delete_file(fullpath, mtime)
+        if rule is not None and not fresh:
+          mtime = os.stat(fullpath).st_mtime
+          rule = should_delete_file(fullpath, mtime)
+        if rule is not None and args.gzip:
+          if not fullpath.endswith(compressed_suffixes):
+            actions.append(('gzip', fullpath, dirpath_mtime))
+            dir_got_compressed = True
+            if report is not None:
+              report.add(rule, fullpath, size, mtime)
+        elif rule is not None:
+          actions.append(('remove', fullpath, None))
+          dir_got_modified = True
+          if report is not None:
+            report.add(rule, fullpath, size, mtime)
+          continue
+
+    except FileNotFoundError:
+      continue
+
+    remaining += 1
+
+  def finish():
+    '''Deal with the directories, once their subtrees are done'''
+    nonlocal remaining, dir_got_modified
+    for fullpath,path,mtime,left in subdirs:
+      if isinstance(left, concurrent.futures.Future):
+        left = left.result()
+      elif isinstance(left, Pending):
+        left = left.finish()
+      if left == 0 and not protected and should_delete_dir(fullpath, mtime):
+        actions.append(('rmdir', fullpath, None))
+        dir_got_modified = True
+        if report is not None:
+          report.add('empty', fullpath, 0, mtime)
+        if index is not None and not args.dryrun:
+          index.forget(path)
+      else:
+        remaining += 1
+
+    # restore the directory's modification time if we modified it:
+    if dir_got_modified:
+      actions.append(('utime', dirpath, dirpath_mtime))
+
+    # and rescan it next time, since its mtime no longer tells:
+    if index is not None and not args.dryrun:
+      if dir_got_modified or dir_got_compressed:
+        index.invalidate(dirpath)
+
+    return remaining
+
+  # above the -split depth, finish only after every subtree was submitted,
+  # so no directory's subtrees hold up the crawl of the next one:
+  if crawlers is not None and depth < args.split:
+    return Pending(finish)
+  return finish()
+
+def crawl_subtree(dirpath, dirpath_mtime, depth):
+  '''Crawl a whole subtree and hand its actions to the deleter'''
+  # already done before an interruption, so never consider it empty:
+  if dirpath in deleter.completed:
+    return 1
+  actions = []
+  remaining = crawl(dirpath, dirpath_mtime, actions, depth)
+  deleter.submit(actions, dirpath)
+  return remaining
+
+def descend(dirpath, dirpath_mtime, actions, depth):
+  '''Crawl a subdirectory, as its own subtree if at the -split depth'''
+  if depth == args.split:
+    if crawlers is not None:
+      return crawlers.submit(crawl_subtree, dirpath, dirpath_mtime, depth)
+    return crawl_subtree(dirpath, dirpath_mtime, depth)
+  return crawl(dirpath, dirpath_mtime, actions, depth)
+
+########################################################################
+########################################################################
+
+def main(argv, found=None, crawled=None):
+  '''Run a cleanup with the given command line, also calling found(path,
+  depth) on every file the crawl sees, and crawled() after the crawl but
+  before anything is deleted, if not None'''
+
+  global args, now, trashes, ignores, on_file
+  global deletes, report, deleter, compressor, index, crawlers
+
+  cli = get_cli()
+  on_file = found
+
+  args = cli.parse_args(argv)
+
+  now = time.time()
+
+  if args.delete < 0:
+    if args.empty < 0:
+      if args.trash < 0:
+        cli.error('At least one of -delete/empty/trash must be set.')
+        sys.exit(1)
+
+  if args.threads < 1 or args.split < 0:
+    cli.error('-threads must be positive and -split non-negative.')
+
+  if args.threads > 1 and args.split == 0:
+    cli.error('-threads requires a positive -split, the depth of the subtrees to crawl in parallel.')
+
+  if args.unlinkers < 1 or args.latency <= 0:
+    cli.error('-unlinkers and -latency must be positive.')
+
+  if args.zstd and zstandard is None:
+    cli.error('-zstd requires the zstandard module.')
+
+  if args.gzipworkers < 1:
+    cli.error('-gzipworkers must be positive.')
+
+  if len(args.ignores)>0 and args.noignores:
+    cli.error('You cannot set both -noignores and -ignores.')
+
+  if len(args.trashes)==0:
+    args.trashes = default_trashes
+
+  if len(args.ignores)==0:
+    args.ignores = default_ignores
+
+  if args.noignores:
+    args.ignores = []
+
+  if args.notrashes:
+    args.trashes = []
+
+  trashes = Matcher(args.trashes)
+  ignores = Matcher(args.ignores)
+
+  # Finally, crawl the filesystem and do stuff, in a single pass:
+  # directories are handled after their contents, so any that become
+  # empty along the way (or would, for a dryrun) are deleted too.
+  # Subtrees at the -split depth are crawled by -threads in parallel,
+  # while the few directories above them are finished at the end.
+
+  deletes = []
+
+  report = None
+  if args.report is not None:
+    report = Report(args.path)
+
+  atexit.register(cleanup, dryrun=args.dryrun, deletes=deletes, report=report)
+
+  deleter = Deleter(args.unlinkers, args.rate, args.latency/1000, args.checkpoint, crawled is not None)
+
+  compressor = None
+  if args.gzip and not args.dryrun:
+    compressor = Compressor(args.gzipworkers)
+
+  index = None
+  if args.index is not None:
+    index = Index(args.index)
+
+  crawlers = None
+  if args.threads > 1:
+    crawlers = concurrent.futures.ThreadPoolExecutor(args.threads)
+
+  actions = []
+  if args.split == 0:
+    crawl_subtree(args.path, os.stat(args.path).st_mtime, 0)
+  else:
+    left = crawl(args.path, os.stat(args.path).st_mtime, actions)
+    if isinstance(left, Pending):
+      left.finish()
+  if crawled is not None:
+    crawled()
+    deleter.release()
+  # upper levels go after all the subtrees below them are done:
+  deleter.wait()
+  deleter.submit(actions)
+  deleter.wait()
+  deleter.finish()
+
+  if index is not None:
+    index.close()
+
+  if compressor is not None:
+    compressor.wait()
+    if compressor.errors > 0:
+      sys.exit(1)
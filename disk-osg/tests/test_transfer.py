@@ -0,0 +1,36 @@
+#
+# Tests of transfer.py's rsync wrapper, with a stand-in rsync on the PATH.
+#
+
+import os
+import sys
+import stat
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transfer
+
+class TestRsync(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    rsync = os.path.join(self.tmp.name, 'rsync')
+    with open(rsync, 'w') as f:
+      f.write('#!/bin/sh\necho hi\nexec sleep 10\n')
+    os.chmod(rsync, stat.S_IRWXU)
+    self.path = os.environ['PATH']
+    os.environ['PATH'] = self.tmp.name + os.pathsep + self.path
+
+  def tearDown(self):
+    os.environ['PATH'] = self.path
+    self.tmp.cleanup()
+
+  def test_timeout_after_output(self):
+    args = transfer.cli.parse_args(['-src', self.tmp.name, '-dest', self.tmp.name,
+      '-shardtimeout', '1', '-verbose'])
+    self.assertFalse(transfer.rsync(args, ['a.hipo']))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+#
+# For rsyncing sufficiently old OSG data files from the local filesystem
+# to their final destination, deleting local copies after a successful
+# transfer, and doing local filesystem cleanup, all from a single crawl.
+# Transfer candidates are found by the same crawl that disk-cleanup.py
+# does, and then rsync'd in parallel shards, one per user/job_N
+# submission directory, each with its own timeout and retries.  Finished
+# shards are recorded, so their nodeScript.sh files aren't sent again.
+# Each run's numbers can be appended to a JSON-lines file (-metrics),
+# and tabulated later (-summary) to see whether transfers keep up.
+#
+# Intended to be called by transfer.sh, which does the sanity checks.
+#
+
+import os
+import sys
+import stat
+import time
+import json
+import tempfile
+import argparse
+import threading
+import subprocess
+import concurrent.futures
+
+import diskcleanup
+
+# depths relative to -src, as in `find -mindepth N -maxdepth N`:
+hipo_depth = 5
+script_depth = 3
+
+# depth of the directories that transfers are sharded by, i.e. user/job_N:
+shard_depth = 2
+
+# how long to remember shards in the -state file:
+state_retention = 30*24*60*60
+
+cli = argparse.ArgumentParser(description='''Transfer old *.hipo files (with
+  local deletion) and nodeScript.sh files (without) to a destination, and
+  cleanup the local filesystem, all from one crawl of it.''')
+cli.add_argument('-src', default=None, type=str, help='local directory to transfer from and cleanup')
+cli.add_argument('-dest', default=None, type=str, help='rsync destination, e.g. user@host:path')
+cli.add_argument('-minutes', default=60, metavar='#', type=int, help='age threshold in minutes, since last status change, for transfers (default=60)')
+cli.add_argument('-timeout', default=5400, metavar='#', type=int, help='rsync I/O timeout in seconds (default=5400)')
+cli.add_argument('-streams', default=4, metavar='#', type=int, help='number of concurrent rsyncs, one per submission directory (default=4)')
+cli.add_argument('-shardtimeout', default=3600, metavar='#', type=int, help='time limit in seconds for each rsync of a submission directory (default=3600)')
+cli.add_argument('-retries', default=2, metavar='#', type=int, help='number of times to retry a failed rsync (default=2)')
+cli.add_argument('-state', default=None, metavar='PATH', type=str, help='JSON file of the progress of each submission directory, to not resend unchanged nodeScript.sh')
+cli.add_argument('-delete', default=7, metavar='#', type=int, help='age threshold in days for cleanup of files and empty directories (default=7)')
+cli.add_argument('-trash', default=2, metavar='#', type=int, help='age threshold in days for cleanup of trash (default=2)')
+cli.add_argument('-index', default=None, metavar='PATH', type=str, help='passed on to disk-cleanup.py')
+cli.add_argument('-threads', default=1, metavar='#', type=int, help='passed on to disk-cleanup.py')
+cli.add_argument('-metrics', default=None, metavar='PATH', type=str, help='JSON-lines file to append the numbers from each run to')
+cli.add_argument('-summary', default=None, metavar='#', type=int, const=24, nargs='?', help='tabulate the last # runs from -metrics, instead of transferring (default=24)')
+cli.add_argument('-verbose', default=False, action='store_true', help='make rsync verbose')
+cli.add_argument('-dryrun', default=False, action='store_true', help='do not transfer/delete anything, just print')
+
+########################################################################
+########################################################################
+
+class Candidates():
+  '''Files to transfer, (path,ctime,size) relative to the source directory and
+  grouped by shard (user/job_N), collected from the crawl's threads'''
+  def __init__(self, top, minutes):
+    self.top = top.rstrip('/') + '/'
+    # only files whose status changed before this are old enough:
+    self.cutoff = time.time() - minutes*60
+    self.lock = threading.Lock()
+    self.hipo = {}
+    self.script = {}
+  def found(self, path, depth):
+    if depth == hipo_depth and path.endswith('.hipo'):
+      files = self.hipo
+    elif depth == script_depth and path.endswith('/nodeScript.sh'):
+      files = self.script
+    else:
+      return
+    try:
+      st = os.lstat(path)
+    except FileNotFoundError:
+      return
+    if stat.S_ISREG(st.st_mode) and st.st_ctime < self.cutoff:
+      path = path[len(self.top):]
+      shard = '/'.join(path.split('/')[:shard_depth])
+      with self.lock:
+        files.setdefault(shard, []).append((path, st.st_ctime, st.st_size))
+
+class State():
+  '''The -state file of shards' progress, saved after every change, with
+  the crawl cutoff when each was last completed, so nodeScript.sh files,
+  which are not removed after transfer, are not sent again unless they
+  changed since then'''
+  def __init__(self, path):
+    self.path = path
+    self.lock = threading.Lock()
+    self.shards = {}
+    if path is not None and os.path.exists(path):
+      with open(path,'r') as f:
+        self.shards = json.load(f)
+    for shard,x in list(self.shards.items()):
+      if time.time() - x['time'] > state_retention:
+        self.shards.pop(shard)
+  def get_new(self, shard, files):
+    '''Return only files that changed since the shard was last completed.
+    Not for *.hipo files, which may be older than that but were missed
+    then, e.g. if still being written or moved in, and anyway are only
+    still there if their transfer didn't finish.'''
+    done = self.shards.get(shard,{}).get('done', 0)
+    return [ x for x in files if x[1] > done ]
+  def update(self, shard, **kwargs):
+    with self.lock:
+      x = self.shards.setdefault(shard, {})
+      x.update(kwargs)
+      x['time'] = time.time()
+      if self.path is not None:
+        tmp = '%s.%d.tmp'%(self.path, os.getpid())
+        with open(tmp,'w') as f:
+          f.write(json.dumps(self.shards))
+        os.replace(tmp, self.path)
+
+def rsync(args, files, remove=False):
+  '''Run an rsync of a list of files, relative to -src, printing its
+  output all at once, and return whether it succeeded'''
+  opts = ['--stats', '--timeout', str(args.timeout)]
+  if args.verbose:
+    opts.insert(0, '-vv')
+  if args.dryrun:
+    opts.append('--dry-run')
+  if remove:
+    opts.append('--remove-source-files')
+  with tempfile.NamedTemporaryFile('w', prefix='transfer.', suffix='.txt') as f:
+    f.write('\n'.join(files)+'\n')
+    f.flush()
+    cmd = ['rsync', '-a', '-R', '--files-from='+f.name] + opts + [args.src, args.dest]
+    try:
+      p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        universal_newlines=True, timeout=args.shardtimeout)
+      output, success = p.stdout, p.returncode == 0
+    except subprocess.TimeoutExpired as e:
+      # (whatever it printed before the timeout comes back as bytes)
+      output = e.output or ''
+      if isinstance(output, bytes):
+        output = output.decode(errors='replace')
+      output += '\nTimed out after %d seconds.'%args.shardtimeout
+      success = False
+  with print_lock:
+    print(' '.join(cmd))
+    print(output)
+  return success
+
+def retry(args, state, shard, files, remove=False):
+  '''Run an rsync, retrying with increasing delays, and return whether
+  it eventually succeeded'''
+  for tries in range(args.retries+1):
+    if tries > 0:
+      time.sleep(30*2**(tries-1))
+    state.update(shard, status='running', tries=tries+1)
+    if rsync(args, files, remove):
+      return True
+  return False
+
+def transfer(args, state, shard, hipo, script, cutoff):
+  '''Transfer one shard's files, all changed before cutoff, and return a
+  list of any failures, and lists of the files that were and weren't
+  transferred'''
+  errors, done, failed = [], [], []
+  state.update(shard, status='running', tries=0, files=len(hipo)+len(script))
+  if len(hipo) > 0:
+    # rsync again with local deletion only after the first claimed success,
+    # where it checks everything again before removing sources:
+    paths = [ x[0] for x in hipo ]
+    if not retry(args, state, shard, paths):
+      errors.append('rsync *.hipo for %s'%shard)
+    elif not args.dryrun and not retry(args, state, shard, paths, remove=True):
+      errors.append('rsync *.hipo with removal for %s'%shard)
+    (failed if len(errors) > 0 else done).extend(hipo)
+  # (one day we can remove this, after job specifications are in HIPO)
+  if len(script) > 0:
+    if not retry(args, state, shard, [ x[0] for x in script ]):
+      errors.append('rsync nodeScript.sh for %s'%shard)
+      failed.extend(script)
+    else:
+      done.extend(script)
+  if len(errors) > 0:
+    state.update(shard, status='failed')
+  elif not args.dryrun:
+    state.update(shard, status='done', done=cutoff)
+  return errors, done, failed
+
+def transfer_all(args, state, candidates):
+  '''Transfer all the candidates, one shard per stream, and return the
+  files found, any failures, the files that were and weren't transferred,
+  and how long it took'''
+
+  # skip scripts already sent, before a restart or in a previous run:
+  shards = {}
+  for shard in sorted(set(candidates.hipo).union(candidates.script)):
+    hipo = candidates.hipo.get(shard, [])
+    script = state.get_new(shard, candidates.script.get(shard, []))
+    if len(hipo) + len(script) > 0:
+      shards[shard] = (hipo, script)
+
+  found = [ x for hipo,script in shards.values() for x in hipo + script ]
+
+  if len(found) == 0:
+    print('\nNo Files to Transfer.')
+
+  else:
+    print('\nFiles to Transfer:')
+    for x in found:
+      print(x[0])
+    print()
+
+  start = time.time()
+  errors, done, failed = [], [], []
+  with concurrent.futures.ThreadPoolExecutor(args.streams) as pool:
+    futures = []
+    for shard,(hipo,script) in shards.items():
+      futures.append(pool.submit(transfer, args, state, shard, hipo, script, candidates.cutoff))
+    for f in futures:
+      for x,y in zip((errors, done, failed), f.result()):
+        x.extend(y)
+
+  return found, errors, done, failed, time.time() - start
+
+def get_disk_fill(path):
+  '''Return the used fraction of a filesystem, the same as df's Use%'''
+  st = os.statvfs(path)
+  used = st.f_blocks - st.f_bfree
+  return float(used) / max(1, used + st.f_bavail)
+
+def print_summary(path, n):
+  '''Tabulate the last n runs from a -metrics file'''
+  with open(path,'r') as f:
+    runs = [ json.loads(x) for x in f if x.strip() ][-n:]
+  fmt = '%-16s %7s %7s %9s %8s %7s %7s %7s %7s %9s %5s'
+  print(fmt%('time','found','xfer','xfer GB','MB/s','failed','deleted','crawl s','xfer s','backlog h','fill'))
+  for x in runs:
+    mbps = x['transferred_bytes']/1e6/max(1e-3,x['transfer_seconds'])
+    print(fmt%(time.strftime('%Y/%m/%d %H:%M', time.localtime(x['time'])),
+      x['found_files'], x['transferred_files'], '%.2f'%(x['transferred_bytes']/1e9),
+      '%.1f'%mbps, x['failed_files'], x['deleted_files'], '%.0f'%x['crawl_seconds'],
+      '%.0f'%x['transfer_seconds'], '%.1f'%(x['backlog_age']/3600), '%.0f%%'%(100*x['disk_fill'])))
+
+print_lock = threading.Lock()
+
+########################################################################
+########################################################################
+
+def main(argv):
+
+  args = cli.parse_args(argv)
+
+  if args.summary is not None:
+    if args.metrics is None:
+      cli.error('-summary requires -metrics.')
+    print_summary(args.metrics, args.summary)
+    return
+
+  if args.src is None or args.dest is None:
+    cli.error('-src and -dest are required.')
+
+  if args.streams < 1 or args.retries < 0:
+    cli.error('-streams must be positive and -retries non-negative.')
+
+  candidates = Candidates(args.src, args.minutes)
+  state = State(args.state)
+  metrics = {'time':time.time()}
+
+  # crawl once, collecting transfer candidates and deciding the cleanup,
+  # and transfer before anything's deleted, so directories emptied by the
+  # transfers don't wait for the next run:
+  # (*.hipo and job-level nodeScript.sh are ignored by the cleanup)
+  opts = ['-path', args.src, '-delete', str(args.delete), '-empty', str(args.delete)]
+  opts.extend(['-trash', str(args.trash), '-threads', str(args.threads)])
+  if args.index is not None:
+    opts.extend(['-index', args.index])
+  if args.dryrun:
+    opts.append('-dryrun')
+  opts.extend(['-report','table'])
+  results = []
+  def crawled():
+    metrics['crawl_seconds'] = time.time() - metrics['time']
+    results.append(transfer_all(args, state, candidates))
+    print('\nFiles to Delete:')
+  # a cleanup failure mustn't block the transfers, which matter more:
+  cleanup_error = None
+  try:
+    diskcleanup.main(opts, candidates.found, crawled)
+  except (Exception, SystemExit) as e:
+    # (but a failure of the transfers themselves is not the cleanup's)
+    if 'crawl_seconds' in metrics and len(results) == 0:
+      raise
+    cleanup_error = e
+    print('ERROR:  cleanup failed:  %r'%e, file=sys.stderr)
+  # if it failed during the crawl, transfer what was found:
+  if len(results) == 0:
+    metrics['crawl_seconds'] = time.time() - metrics['time']
+    results.append(transfer_all(args, state, candidates))
+  found, errors, done, failed, transfer_seconds = results[0]
+
+  if args.metrics is not None and not args.dryrun:
+    metrics['transfer_seconds'] = transfer_seconds
+    for key,files in [('found',found), ('transferred',done), ('failed',failed)]:
+      metrics[key+'_files'] = len(files)
+      metrics[key+'_bytes'] = sum([ x[2] for x in files ])
+    deleted = []
+    if getattr(diskcleanup, 'report', None) is not None:
+      deleted = diskcleanup.report.groups['rule'].values()
+    metrics['deleted_files'] = sum([ x['count'] for x in deleted ])
+    metrics['deleted_bytes'] = sum([ x['bytes'] for x in deleted ])
+    metrics['backlog_files'] = len(failed)
+    now = time.time()
+    metrics['backlog_age'] = now - min([ x[1] for x in failed ], default=now)
+    metrics['disk_fill'] = get_disk_fill(args.src)
+    with open(args.metrics,'a') as f:
+      f.write(json.dumps(metrics)+'\n')
+
+  for x in errors:
+    print('ERROR:  %s failed.'%x, file=sys.stderr)
+  if len(errors) > 0:
+    sys.exit(6)
+  if cleanup_error is not None:
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
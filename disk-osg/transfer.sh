@@ -4,9 +4,9 @@
 #
 # For rsyncing sufficiently old OSG data files from local scosg##
 # filesystem to final Lustre destination for users, and deleting
-# their local copies upon successful transfer.  A separate python
-# script is called at the end to do local filesystem cleanup to 
-# avoid excessive finds.
+# their local copies upon successful transfer.  The transfers and
+# local filesystem cleanup are done by transfer.py, from a single
+# crawl of the filesystem, to avoid excessive finds.
 #
 # Does *not* delete anything at the destination, but there should be
 # something in place to at least clean up old empty directories there.
@@ -54,20 +54,31 @@ dest=$user@$remotehost:$remotepath
 # timeout transfer if it takes longer than this many seconds: 
 rsync_timeout=5400
 
+# number of concurrent rsyncs, each for one user/job_N submission:
+rsync_streams=4
+
+# progress of each submission's transfers, to skip finished ones on restart:
+transfer_state=$HOME/transfer-state.json
+
+# per-run numbers, see `transfer.py -summary -metrics $transfer_metrics`:
+transfer_metrics=$srcdir/transfers/metrics.jsonl
+
 # data files older than this will be rsync'd to $dest:
 rsync_minutes=60
 
 # files older than this will be deleted from $srcdir:
 delete_days=7
 
+# directory listings cached between cleanups of $srcdir:
+cleanup_index=$HOME/disk-cleanup-index.sqlite
+
 # script name and absolute path containing this script:
 scriptname=$(basename $0)
 dirname="$(cd "$(dirname "${BASH_SOURCE[0]}")" &> /dev/null && pwd)"
 
 # output files for this instance of this script:
-mkdir -p $srcdir/transfers /tmp/gemc
+mkdir -p $srcdir/transfers
 timestamp=$(date +%Y%m%d_%H%M%S)
-tmpfile=$(mktemp /tmp/gemc/$timestamp.XXXXXX)
 logfile=$(mktemp $srcdir/transfers/$timestamp.XXXXXX.log)
 
 # conveneniences for logging:
@@ -103,24 +114,21 @@ while getopts "dvh" opt; do
   esac
 done
 
-# setup verbose/dryrun rsync options:
-rsync_opts="--stats --timeout $rsync_timeout"
+# setup verbose/dryrun transfer options:
+transfer_opts="-src $srcdir -dest $dest -minutes $rsync_minutes -timeout $rsync_timeout"
+transfer_opts="$transfer_opts -streams $rsync_streams -state $transfer_state -metrics $transfer_metrics"
+transfer_opts="$transfer_opts -delete $delete_days -trash 2 -index $cleanup_index"
 if [ $verbose -ne 0 ]; then
-  rsync_opts="-vv $rsync_opts"
+  transfer_opts="$transfer_opts -verbose"
 fi
 if [ $dryrun -ne 0 ]; then
-  rsync_opts="$rsync_opts --dry-run"
+  transfer_opts="$transfer_opts -dryrun"
 fi
 
 ########################################################################
 # Convenience functions:
 ########################################################################
 
-function cleanup {
-  rm -f $tmpfile
-}
-trap cleanup EXIT
-
 function dateit {
   d=`date +%Y-%m-%d\ %H:%M:%S`
   echo "$infomsg $@ - $d" >> $logfile
@@ -180,65 +188,16 @@ check_duplicates "rsync.*$user@$remotehost"
 [ $? -ne 0 ] && echo "$errmsg rsync $user@$remotehost already running." && exit 66 
 
 ########################################################################
-# Do the transfers from local $srcdir to remote $dest:
+# Do the transfers from local $srcdir to remote $dest, and cleanup:
 ########################################################################
 
-pushd $srcdir > /dev/null
-
-[ $(pwd) != "$srcdir" ] && echo "$errmsg Failed to get to $srcdir." | $tee && exit 10
-
-# transfer *.hipo data files older than some minutes:
-
-dateit FIND HIPO
-find . -mindepth 5 -maxdepth 5 -type f -cmin +$rsync_minutes -name '*.hipo' > $tmpfile 2>&1 | $tee
-[ $? -ne 0 ] && echo "$errmsg find *.hipo failed, aborting." | $tee && exit 5
-
-if [ -s $tmpfile ]; then
-
-  echo "$infomsg Files to Transfer:" >> $logfile ; cat $tmpfile >> $logfile
-  dateit RSYNC HIPO1
-  rsync -a -R --files-from=$tmpfile $rsync_opts $srcdir $dest >> $logfile
-  [ $? -ne 0 ] && echo "$errmsg rsync *.hipo failed, aborting." | $tee && exit 6
-
-  # first rsync claimed sucess, run it again with local deletion:
-  if [ $dryrun -eq 0 ]; then
-    dateit RSYNC HIPO2
-    rsync -a -R --remove-source-files --files-from=$tmpfile $rsync_opts $srcdir $dest >> $logfile
-    [ $? -ne 0 ] && echo "$errmsg rsync *.hipo failed, aborting." | $tee && exit 6
-  fi
+# transfer *.hipo data files and the top-level nodeScript.sh from each
+# submission, all older than some minutes, and cleanup old stuff on the
+# local $srcdir filesystem, with a single crawl:
 
-  # transfer the top-level nodeScript.sh from each submission:
-  # (one day we can remove this, after job specifications are in HIPO)
-
-  dateit FIND SCRIPT
-  find . -mindepth 3 -maxdepth 3 -type f -cmin +$rsync_minutes -name 'nodeScript.sh' > $tmpfile 2>&1 | $tee
-  [ $? -ne 0 ] && echo "$errmsg find nodeScript failed, aborting." | $tee && exit 7
-
-  if [ -s $tmpfile ]; then
-    dateit RSYNC SCRIPT
-    rsync -a -R --files-from=$tmpfile $rsync_opts $srcdir $dest >> $logfile
-    [ $? -ne 0 ] && echo "$errmsg rsync nodeScript failed, aborting." | $tee && exit 8
-  fi
-
-else
-  echo "$infomsg No Files to Transfer." >> $logfile
-fi
-
-popd > /dev/null
-
-########################################################################
-# Cleanup old stuff on local $srcdir filesystem:
-########################################################################
-
-# minimize finds, reduce to a single crawl for deletions:
-opts="-path $srcdir -delete $delete_days -empty $delete_days -trash 2"
-if [ $dryrun -ne 0 ]; then
-    opts="$opts -dryrun"
-fi
-dateit CLEANUP
-echo "$infomsg Files to Delete:" >> $logfile
-$dirname/disk-cleanup.py $opts 2>&1 >> $logfile
-[ $? -ne 0 ] && echo "$errmsg disk-cleanup.py failed." | $tee
+dateit TRANSFER
+$dirname/transfer.py $transfer_opts 2>&1 >> $logfile
+[ $? -ne 0 ] && echo "$errmsg transfer.py failed." | $tee
 
 ########################################################################
 # Done